@@ -0,0 +1,51 @@
+"""Compares JSON backends on saved agreement pages.
+
+Usage: python -m benchmarks.json_backends <HealthCareData or Agreements directory> [repeats]
+"""
+import sys
+import time
+from pathlib import Path
+
+from src.PolishNHSDataMongifyer.data_processing.file_manager import FileDataManagement
+from src.PolishNHSDataMongifyer.serialization.json_backend import BACKEND_FACTORIES, create_backend
+
+def load_pages(root: Path):
+    directories = [root] if root.name == "Agreements" else sorted(root.rglob("Agreements"))
+    return [Path(path).read_bytes() for directory in directories
+            for path in FileDataManagement.agreement_pages_in(directory)]
+
+def timed(function, items, repeats: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for item in items:
+            function(item)
+    return time.perf_counter() - start
+
+def main():
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+    pages = load_pages(Path(sys.argv[1]))
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    if not pages:
+        print(f"No agreement pages found under {sys.argv[1]}")
+        sys.exit(1)
+    total_mb = sum(len(page) for page in pages) / 1024 / 1024
+    print(f"{len(pages)} pages, {total_mb:.2f} MB, {repeats} repeats")
+
+    print(f"{'backend':<10}{'decode MB/s':>14}{'encode MB/s':>14}{'pretty MB/s':>14}")
+    for name in BACKEND_FACTORIES:
+        try:
+            backend = create_backend(name)
+        except ImportError:
+            print(f"{name:<10}{'not installed':>14}")
+            continue
+        decoded = [backend.loads(page) for page in pages]
+        decode = timed(backend.loads, pages, repeats)
+        encode = timed(lambda obj: backend.dumps(obj, False), decoded, repeats)
+        pretty = timed(lambda obj: backend.dumps(obj, True), decoded, repeats)
+        throughput = lambda seconds: total_mb * repeats / seconds
+        print(f"{name:<10}{throughput(decode):>14.1f}{throughput(encode):>14.1f}{throughput(pretty):>14.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""Measures startup of the tool: time until the menu can be shown and time until the first API request is sent.
+
+Every sample runs in a fresh interpreter. The first request goes to a local server that answers with an empty
+agreements page, so the measurement does not depend on the network or the NFZ API.
+
+Usage: python -m benchmarks.startup [repeats]
+"""
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Tuple
+
+ROOT = Path(__file__).resolve().parent.parent
+
+MENU_SCRIPT = """
+import time
+from src.main import main
+print(time.time())
+"""
+
+# Mirrors the imports and setup main() does for a single configuration before fetching agreements
+FIRST_REQUEST_SCRIPT = """
+import sys
+from src.main import main
+from src.PolishNHSDataMongifyer.collection_setup.db_setup import DatabaseSetup
+from src.PolishNHSDataMongifyer.data_models.custom_models import DBSetupConfig
+from src.PolishNHSDataMongifyer.data_processing import processor
+from src.PolishNHSDataMongifyer.data_processing.file_manager import FileDataManagement
+from src.PolishNHSDataMongifyer.validation.validation import Validation
+
+processor.NFZAPI_BASE_URL = sys.argv[1]
+config = Validation.validate_list([{"branch": "07", "service_type": "04", "page_size": 25}], DBSetupConfig)[0]
+file_manager = FileDataManagement(config.branch, config.service_type, f"{sys.argv[2]}/main.py", config.year)
+data_processor = processor.HealthcareDataProcessing(config.branch, config.service_type, file_manager)
+data_processor.process_agreements(limit=config.page_size)
+"""
+
+EMPTY_PAGE = b'{"meta": {"page": 1, "limit": 25, "count": 0}, "links": {"next": null}, "data": {"agreements": []}}'
+
+class FirstRequestHandler(BaseHTTPRequestHandler):
+    received_at = []
+
+    def do_GET(self):
+        FirstRequestHandler.received_at.append(time.time())
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(EMPTY_PAGE)))
+        self.end_headers()
+        self.wfile.write(EMPTY_PAGE)
+
+    def log_message(self, format, *args):
+        pass
+
+def run(script: str, *args) -> Tuple[float, str]:
+    """Runs the script in a new interpreter inside a temporary directory, returns its start time and output."""
+    env = {**os.environ, "PYTHONPATH": str(ROOT)}
+    env.pop("HTTP_CACHE_DIR", None)
+    with tempfile.TemporaryDirectory() as directory:
+        started = time.time()
+        completed = subprocess.run([sys.executable, "-c", script, *args, directory], cwd=directory, env=env,
+                                   capture_output=True, text=True)
+    if completed.returncode != 0:
+        raise RuntimeError(completed.stderr)
+    return started, completed.stdout
+
+def measure_menu() -> float:
+    started, output = run(MENU_SCRIPT)
+    return float(output.strip().splitlines()[-1]) - started
+
+def measure_first_request(url: str) -> float:
+    FirstRequestHandler.received_at.clear()
+    started, _ = run(FIRST_REQUEST_SCRIPT, url)
+    return FirstRequestHandler.received_at[0] - started
+
+def summary(name: str, samples) -> str:
+    milliseconds = [sample * 1000 for sample in samples]
+    return f"{name:<16}{statistics.median(milliseconds):>12.1f}{min(milliseconds):>12.1f}{max(milliseconds):>12.1f}"
+
+def main():
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FirstRequestHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+    try:
+        # One unmeasured run of each, so that bytecode caches are in place
+        measure_menu()
+        measure_first_request(url)
+        menu = [measure_menu() for _ in range(repeats)]
+        first_request = [measure_first_request(url) for _ in range(repeats)]
+    finally:
+        server.shutdown()
+
+    print(f"{repeats} repeats, {sys.executable}")
+    print(f"{'':<16}{'median ms':>12}{'min ms':>12}{'max ms':>12}")
+    print(summary("menu", menu))
+    print(summary("first request", first_request))
+
+if __name__ == "__main__":
+    main()
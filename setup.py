@@ -31,6 +31,10 @@ setup(
     "urllib3>=2.3.0", 
     "yarg>=0.1.10"
     ],
+    extras_require={
+    "fast-json": ["orjson>=3.9"],
+    "parquet": ["pyarrow>=14.0"],
+    },
     python_requires=">=3.10",
     entry_points={
         "console_scripts": [
@@ -0,0 +1,90 @@
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Tuple
+
+from src.PolishNHSDataMongifyer.data_models.records import AgreementInfoRecord
+from src.PolishNHSDataMongifyer.serialization import json_backend
+
+@dataclass(slots=True)
+class AmountStats:
+    total_amount: float = 0.0
+    agreements_count: int = 0
+    min_amount: float = float("inf")
+    max_amount: float = float("-inf")
+
+    def add(self, amount: float):
+        self.total_amount += amount
+        self.agreements_count += 1
+        self.min_amount = min(self.min_amount, amount)
+        self.max_amount = max(self.max_amount, amount)
+
+    def to_dict(self) -> dict:
+        # Not rounded, the stored sum is loaded again and extended by incremental updates
+        return {
+            "total_amount": self.total_amount,
+            "agreements_count": self.agreements_count,
+            "min_amount": self.min_amount,
+            "max_amount": self.max_amount,
+        }
+
+    @classmethod
+    def from_dict(cls, document: dict) -> "AmountStats":
+        return cls(document["total_amount"], document["agreements_count"], document["min_amount"],
+                   document["max_amount"])
+
+class AmountAggregator:
+    """Sums, counts and min/max of agreement amounts per provider and per (branch, service_type, year).
+
+    Every statistic can be extended with new agreements without the old ones, so the aggregate collections are
+    updated incrementally by loading them, adding only agreements that were not counted before and saving them again.
+    """
+
+    def __init__(self):
+        self.by_provider: Dict[str, AmountStats] = {}
+        self.by_service: Dict[Tuple[str, str, int], AmountStats] = {}
+
+    def add(self, agreement: AgreementInfoRecord, branch: str):
+        provider_stats = self.by_provider.get(agreement.provider_code)
+        if provider_stats is None:
+            provider_stats = self.by_provider[agreement.provider_code] = AmountStats()
+        provider_stats.add(agreement.amount)
+
+        service_key = (branch, agreement.service_type, agreement.year)
+        service_stats = self.by_service.get(service_key)
+        if service_stats is None:
+            service_stats = self.by_service[service_key] = AmountStats()
+        service_stats.add(agreement.amount)
+
+    def add_all(self, agreements: Iterable[AgreementInfoRecord], branch: str):
+        for agreement in agreements:
+            self.add(agreement, branch)
+
+    def provider_documents(self) -> List[dict]:
+        return [{"provider_code": provider_code, **stats.to_dict()}
+                for provider_code, stats in sorted(self.by_provider.items())]
+
+    def service_documents(self) -> List[dict]:
+        return [{"branch": branch, "service_type": service_type, "year": year, **stats.to_dict()}
+                for (branch, service_type, year), stats in sorted(self.by_service.items())]
+
+    @classmethod
+    def from_documents(cls, provider_documents: List[dict], service_documents: List[dict]) -> "AmountAggregator":
+        aggregator = cls()
+        for document in provider_documents:
+            aggregator.by_provider[document["provider_code"]] = AmountStats.from_dict(document)
+        for document in service_documents:
+            service_key = (document["branch"], document["service_type"], document["year"])
+            aggregator.by_service[service_key] = AmountStats.from_dict(document)
+        return aggregator
+
+    @classmethod
+    def load(cls, provider_collection_path, service_collection_path) -> "AmountAggregator":
+        try:
+            provider_documents = json_backend.load(provider_collection_path)
+            service_documents = json_backend.load(service_collection_path)
+        except (FileNotFoundError, json_backend.JSONDecodeError):
+            return cls()
+        return cls.from_documents(provider_documents, service_documents)
+
+    def save(self, provider_collection_path, service_collection_path):
+        json_backend.dump(self.provider_documents(), provider_collection_path)
+        json_backend.dump(self.service_documents(), service_collection_path)
@@ -0,0 +1,65 @@
+import traceback
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Set
+
+from src.PolishNHSDataMongifyer.collection_setup.db_setup import DatabaseSetup
+from src.PolishNHSDataMongifyer.data_models.custom_models import DBSetupConfig
+from src.PolishNHSDataMongifyer.data_processing.file_manager import FileDataManagement
+from src.PolishNHSDataMongifyer.data_processing.processor import HealthcareDataProcessing
+from src.PolishNHSDataMongifyer.logging.logger import get_logger
+logger = get_logger(__name__)
+
+class HistoricalBackfill:
+    """Loads agreements of every year in config.year..config.year_to for a single branch and service type.
+
+    Agreement pages of all years are fetched concurrently, every request going through the shared NFZ rate limiter.
+    Providers and their geographical data are shared by all years, so each provider is fetched and geocoded once.
+    """
+
+    def __init__(self, config: DBSetupConfig, path: Path, max_workers: int = 4):
+        self.config = config
+        self.max_workers = max_workers
+        file_manager = FileDataManagement(config.branch, config.service_type, path, config.year)
+        self.processors = {
+            year: HealthcareDataProcessing(config.branch, config.service_type, file_manager.for_year(year),
+                                           strict_validation=config.strict_validation)
+            for year in config.years
+        }
+
+    def run(self):
+        fetched_years = self.process_agreements()
+
+        for year, processor in self.processors.items():
+            logger.info(f"Processing providers of year {year} for branch {self.config.branch.value}")
+            processor.process_output_providers(max_workers=self.max_workers)
+
+        # Every processor points to the same providers files, so geographical data is processed once for all years
+        next(iter(self.processors.values())).process_provider_geographical_data()
+
+        for year, processor in self.processors.items():
+            if year not in fetched_years:
+                logger.error(f"Agreements of year {year} for branch {self.config.branch.value} are incomplete, "
+                             f"collections are not built")
+                continue
+            DatabaseSetup(self.config.model_copy(update={"year": year, "year_to": None}), processor, fetch_data=False)
+
+    def process_agreements(self) -> Set[int]:
+        """Fetches agreements of all years concurrently, returns the years whose pages were fetched completely."""
+        fetched_years = set()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {
+                executor.submit(processor.process_agreements, year=year, limit=self.config.page_size,
+                                resume=self.config.resume): year
+                for year, processor in self.processors.items()
+            }
+            for future in as_completed(futures):
+                year = futures[future]
+                try:
+                    if future.result():
+                        fetched_years.add(year)
+                        logger.info(f"Fetched agreements of year {year} for branch {self.config.branch.value}")
+                except Exception as e:
+                    logger.error(f"Could not fetch agreements of year {year} for branch {self.config.branch.value}: {str(e)}")
+                    logger.error(traceback.format_exc())
+        return fetched_years
@@ -0,0 +1,139 @@
+import os
+from pathlib import Path
+from typing import List
+
+from src.PolishNHSDataMongifyer.data_processing.file_manager import FileDataManagement
+from src.PolishNHSDataMongifyer.serialization import json_backend
+from src.PolishNHSDataMongifyer.serialization.atomic_files import temporary_path
+from src.PolishNHSDataMongifyer.logging.logger import get_logger
+logger = get_logger(__name__)
+
+AGREEMENTS_DATASET = "Agreements"
+PROVIDERS_DATASET = "Providers"
+PROVIDERS_GEO_DATASET = "ProvidersGeo"
+DATASETS = (AGREEMENTS_DATASET, PROVIDERS_DATASET, PROVIDERS_GEO_DATASET)
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.dataset
+        import pyarrow.parquet
+    except ImportError as e:
+        raise ImportError("Columnar export requires pyarrow, install it with 'pip install PolishNHSDataMongifyer[parquet]'") from e
+    return pyarrow, pyarrow.parquet
+
+def _partitioning(pa):
+    return pa.dataset.partitioning(
+        pa.schema([("branch", pa.string()), ("service", pa.string()), ("year", pa.int16())]), flavor="hive")
+
+def _schemas(pa):
+    codes = pa.dictionary(pa.int32(), pa.string())
+    return {
+        AGREEMENTS_DATASET: pa.schema([
+            ("id", pa.string()),
+            ("code", pa.string()),
+            ("origin_code", codes),
+            ("service_type", codes),
+            ("service_name", codes),
+            ("amount", pa.float64()),
+            ("provider_code", codes),
+        ]),
+        PROVIDERS_DATASET: pa.schema([
+            ("code", pa.string()),
+            ("nip", pa.string()),
+            ("regon", pa.string()),
+            ("registry_number", pa.string()),
+            ("name", pa.string()),
+            ("phone", pa.string()),
+            ("agreements", pa.list_(pa.string())),
+        ]),
+        PROVIDERS_GEO_DATASET: pa.schema([
+            ("code", pa.string()),
+            ("city", codes),
+            ("street", pa.string()),
+            ("building_number", pa.string()),
+            ("district", codes),
+            ("post_code", codes),
+            ("voivodeship", codes),
+            ("lon", pa.float64()),
+            ("lat", pa.float64()),
+            ("precision", codes),
+        ]),
+    }
+
+class ColumnarExport:
+    """Writes the collections of one configuration as typed Parquet files.
+
+    Every dataset lives under HealthCareData/Exports/<dataset>/ and is hive-partitioned into
+    branch=<code>/service=<ServiceType name>/year=<year>/, so all configurations together form one national dataset
+    that can be scanned with partition filters. Partition keys are not repeated inside the files, code-like columns
+    are dictionary encoded and coordinates are stored as separate lon/lat float columns.
+    """
+
+    def __init__(self, file_manager: FileDataManagement, compression: str = "zstd"):
+        self.file_manager = file_manager
+        self.compression = compression
+        self.EXPORT_DIR = os.path.join(file_manager.OUTPUT_DIR_PATH, "Exports")
+        self.partition = os.path.join(f"branch={file_manager.branch.value}", f"service={file_manager.service.name}",
+                                      f"year={file_manager.YEAR}")
+
+    def dataset_file(self, dataset: str) -> str:
+        return os.path.join(self.EXPORT_DIR, dataset, self.partition, "part-0.parquet")
+
+    def export(self):
+        pa, pq = _import_pyarrow()
+        schemas = _schemas(pa)
+        self._write(pa, pq, AGREEMENTS_DATASET, schemas[AGREEMENTS_DATASET],
+                    json_backend.load(self.file_manager.AGREEMENTS_COLLECTION))
+        self._write(pa, pq, PROVIDERS_DATASET, schemas[PROVIDERS_DATASET],
+                    json_backend.load(self.file_manager.PROVIDERS_COLLECTION))
+
+        geo_rows = []
+        for entry in json_backend.load(self.file_manager.PROVIDERS_GEO_COLLECTION):
+            lon, lat = entry.pop("location")["coordinates"]
+            entry["lon"], entry["lat"] = lon, lat
+            geo_rows.append(entry)
+        self._write(pa, pq, PROVIDERS_GEO_DATASET, schemas[PROVIDERS_GEO_DATASET], geo_rows)
+
+    def _write(self, pa, pq, dataset: str, schema, rows: List[dict]):
+        file_path = self.dataset_file(dataset)
+        Path(file_path).parent.mkdir(parents=True, exist_ok=True)
+        columns = {name: [row.get(name) for row in rows] for name in schema.names}
+        table = pa.Table.from_pydict(columns, schema=schema)
+        buffer = pa.BufferOutputStream()
+        pq.write_table(table, buffer, compression=self.compression)
+        if self._replace(file_path, buffer.getvalue().to_pybytes()):
+            logger.info(f"Exported {table.num_rows} rows to {file_path}")
+
+    @staticmethod
+    def _replace(file_path: str, data: bytes) -> bool:
+        """Writes data through a temporary file and a rename unless the file already holds it, returns whether it did.
+
+        Unlike write_atomic no manifest is kept, it would end up in every partition directory of the dataset.
+        """
+        try:
+            with open(file_path, "rb") as file:
+                if file.read() == data:
+                    return False
+        except FileNotFoundError:
+            pass
+        tmp_path = temporary_path(file_path)
+        try:
+            with open(tmp_path, "wb") as file:
+                file.write(data)
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(tmp_path, file_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return True
+
+def read_export(export_dir, dataset: str, filters=None, columns=None):
+    """Reads a whole exported dataset as a pyarrow Table using memory-mapped files.
+
+    filters use partition columns and values, e.g. [("branch", "=", "07"), ("year", ">=", 2020)].
+    """
+    pa, pq = _import_pyarrow()
+    return pq.read_table(os.path.join(export_dir, dataset), columns=columns, filters=filters,
+                         memory_map=True, partitioning=_partitioning(pa))
@@ -1,191 +1,360 @@
-import json
 import os
 import traceback
-from typing import List
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Dict, List, Optional
 
 from pydantic import ValidationError
 
 from src.PolishNHSDataMongifyer.data_models.custom_models import DBSetupConfig, ProviderGeoEntry
-from src.PolishNHSDataMongifyer.data_models.mongodb_models import AgreementInfo, ProviderGeoData, ProviderInfo
+from src.PolishNHSDataMongifyer.data_models.mongodb_models import AgreementInfo, ProviderAmounts, ProviderGeoData, ProviderInfo, ServiceAmounts
 from src.PolishNHSDataMongifyer.data_models.nhs_api_models import Agreement, Provider
+from src.PolishNHSDataMongifyer.data_models.records import AgreementInfoRecord, ProviderInfoRecord, ProviderRecord, decode_agreements, decode_geo_entries, decode_providers, encode_records
 from src.PolishNHSDataMongifyer.data_processing.file_manager import FileDataManagement
 from src.PolishNHSDataMongifyer.data_processing.processor import HealthcareDataProcessing
+from src.PolishNHSDataMongifyer.serialization import json_backend
+from src.PolishNHSDataMongifyer.serialization.atomic_files import file_hash, get_stamp, inputs_fingerprint, is_recorded, set_stamp
 from src.PolishNHSDataMongifyer.validation.validation import Validation
 from src.PolishNHSDataMongifyer.logging.logger import get_logger
 logger = get_logger(__name__)
 
+# Aggregates and the spatial index are imported by the stages using them, runs with current collections skip both
+if TYPE_CHECKING:
+    from src.PolishNHSDataMongifyer.collection_setup.aggregates import AmountAggregator
+
+COLLECTIONS_STAMP = "collections"
+# Agreement pages the collections were built from, with their content hashes, see get_new_agreement_pages
+PAGES_STAMP = "collections-pages"
+
+@dataclass(slots=True)
+class AgreementPageResult:
+    """Agreements of a single page transformed into collection members, see transform_agreement_page."""
+    page_path: str
+    agreements: List[AgreementInfoRecord] = field(default_factory=list)
+    provider_agreements: Dict[str, List[str]] = field(default_factory=dict)
+    errors: List[str] = field(default_factory=list)
+
+def transform_agreement_page(page_path: str, strict_validation: bool = False) -> AgreementPageResult:
+    """Builds AgreementsCollection members and provider -> agreement ids groupings of one page.
+
+    Runs in worker processes of the parallel collection setup, so it only depends on its arguments and returns
+    errors instead of logging them.
+    """
+    result = AgreementPageResult(page_path)
+    try:
+        page_data = json_backend.load(page_path)
+        if strict_validation:
+            Validation.validate_list(page_data, Agreement)
+        agreements = decode_agreements(page_data)
+    except Exception as e:
+        result.errors.append(f"Could not load agreements page {page_path}: {str(e)}")
+        return result
+
+    for agreement in agreements:
+        result.provider_agreements.setdefault(agreement.provider_code, []).append(agreement.id)
+        try:
+            agreement_info_entry = agreement.to_agreement_info()
+            if strict_validation:
+                Validation.validate(agreement_info_entry.to_dict(), AgreementInfo)
+            result.agreements.append(agreement_info_entry)
+        except ValueError as e:
+            result.errors.append(f"Could not create AgreementsCollection member: {str(e)}")
+    return result
+
+def build_provider_info(providers: Dict[str, ProviderRecord], provider_agreements: Dict[str, List[str]],
+                        strict_validation: bool = False) -> List[ProviderInfoRecord]:
+    """Builds ProvidersInfoCollection members of the providers with agreements, in order of their first agreement."""
+    collection_entries = []
+    for provider_code, agreement_ids in provider_agreements.items():
+        provider = providers.get(provider_code)
+        if not provider:
+            continue
+        try:
+            entry = provider.to_provider_info(agreements=agreement_ids)
+            if strict_validation:
+                Validation.validate(entry.to_dict(), ProviderInfo)
+            collection_entries.append(entry)
+        except ValueError as e:
+            logger.error(f"Error while ProviderInfo collection member in branch: {provider.branch}: {str(e)}")
+            logger.error(traceback.format_exc())
+    return collection_entries
+
+def save_amounts(file_manager: FileDataManagement, amounts: "AmountAggregator", strict_validation: bool = False):
+    if strict_validation:
+        Validation.validate_list(amounts.provider_documents(), ProviderAmounts)
+        Validation.validate_list(amounts.service_documents(), ServiceAmounts)
+    amounts.save(file_manager.PROVIDER_AMOUNTS_COLLECTION, file_manager.SERVICE_AMOUNTS_COLLECTION)
+
+def add_new_agreements(file_manager: FileDataManagement, page_results: List[AgreementPageResult],
+                       strict_validation: bool = False) -> bool:
+    """Extends the agreements, providers info and amount collections with agreements they do not contain yet.
+
+    Only the new pages have to be transformed, existing collection members and aggregates are loaded and extended.
+    Returns False, without writing anything, when the collections are missing or were built without providers that
+    are known now; they have to be rebuilt from all pages then.
+    """
+    from src.PolishNHSDataMongifyer.collection_setup.aggregates import AmountAggregator
+    try:
+        agreements_collection = json_backend.load(file_manager.AGREEMENTS_COLLECTION)
+        providers_collection = json_backend.load(file_manager.PROVIDERS_COLLECTION)
+        amounts = AmountAggregator.from_documents(json_backend.load(file_manager.PROVIDER_AMOUNTS_COLLECTION),
+                                                  json_backend.load(file_manager.SERVICE_AMOUNTS_COLLECTION))
+        providers_data = json_backend.load(file_manager.PROVIDERS_DATA)
+        if strict_validation:
+            Validation.validate_list(providers_data, Provider)
+        providers = {provider.code: provider for provider in decode_providers(providers_data)}
+    except (FileNotFoundError, ValidationError, json_backend.JSONDecodeError) as e:
+        logger.info(f"Collections of {file_manager.COLLECTION_DIR} cannot be extended: {str(e)}")
+        return False
+
+    # Agreement ids of providers without a ProvidersInfo member are not stored anywhere else
+    provider_agreements = {entry["code"]: list(entry["agreements"] or []) for entry in providers_collection}
+    if any(agreement["provider_code"] not in provider_agreements and agreement["provider_code"] in providers
+           for agreement in agreements_collection):
+        logger.info(f"Providers info of {file_manager.COLLECTION_DIR} misses providers that are known now")
+        return False
+
+    known_ids = {agreement["id"] for agreement in agreements_collection}
+    known_provider_agreements = {code: set(agreement_ids) for code, agreement_ids in provider_agreements.items()}
+    new_agreements = []
+    for result in page_results:
+        for provider_code, agreement_ids in result.provider_agreements.items():
+            known = known_provider_agreements.setdefault(provider_code, set())
+            for agreement_id in agreement_ids:
+                if agreement_id not in known:
+                    known.add(agreement_id)
+                    provider_agreements.setdefault(provider_code, []).append(agreement_id)
+        for agreement in result.agreements:
+            if agreement.id not in known_ids:
+                known_ids.add(agreement.id)
+                new_agreements.append(agreement)
+
+    amounts.add_all(new_agreements, file_manager.branch.value)
+    agreements_collection.extend(encode_records(new_agreements))
+    json_backend.dump(agreements_collection, file_manager.AGREEMENTS_COLLECTION)
+    json_backend.dump(encode_records(build_provider_info(providers, provider_agreements, strict_validation)),
+                      file_manager.PROVIDERS_COLLECTION)
+    save_amounts(file_manager, amounts, strict_validation)
+    logger.info(f"Added {len(new_agreements)} agreements to the collections of {file_manager.COLLECTION_DIR}")
+    return True
+
 class DatabaseSetup:                          
-    def __init__(self, config: DBSetupConfig, data_processor: HealthcareDataProcessing):
+    def __init__(self, config: DBSetupConfig, data_processor: HealthcareDataProcessing, fetch_data: bool = True):
             self.branch = config.branch.value
+            self.year = config.year
+            self.strict_validation = config.strict_validation
+            self.collection_workers = config.collection_workers
+            self.columnar_export = config.columnar_export
             self.NHS_processor = data_processor
             self.NHS_file_manager = self.NHS_processor.file_manager
-            self.NHS_processor.process_agreements()
-            self.NHS_processor.process_output_providers()
-            self.NHS_processor.process_provider_geographical_data()
+            self._page_results = None
+            # Whether every collection is in place afterwards, stages only log their errors
+            self.collections_built = False
+            if fetch_data:
+                if not self.NHS_processor.process_agreements(year=self.year, limit=config.page_size,
+                                                             resume=config.resume):
+                    logger.error(f"Agreements of branch {self.branch} for {self.year} are incomplete, "
+                                 f"collections are not built")
+                    return
+                self.NHS_processor.process_output_providers()
+                self.NHS_processor.process_provider_geographical_data()
             
-            self.establish_provider_info_collection()
+            fingerprint = self.get_inputs_fingerprint(config)
+            if self.collections_are_current(fingerprint):
+                logger.info(f"Collections of branch {self.branch} for {self.year} are up to date, skipping")
+                self.collections_built = True
+                return
+
+            # When only agreement pages were added since the last build, the collections are extended with them
+            new_pages = self.get_new_agreement_pages(config)
+            if new_pages is None or not add_new_agreements(self.NHS_file_manager,
+                                                           self.get_agreement_page_results(new_pages),
+                                                           self.strict_validation):
+                self.establish_provider_info_collection()
+                self.establish_agreements_collection()
             self.establish_provider_geo_collection()
-            self.establish_agreements_collection()
-        
-    def get_provider_by_code(self, provider_code: str, providers_list: List[Provider]) -> Provider:
-        for provider in providers_list:
-            if(provider.attributes.code == provider_code):
-                return provider
-        return None
+            self.establish_provider_spatial_index()
+            if config.columnar_export:
+                self.establish_columnar_export()
+
+            if self.outputs_exist():
+                set_stamp(self.NHS_file_manager.COLLECTION_DIR, COLLECTIONS_STAMP, fingerprint)
+                set_stamp(self.NHS_file_manager.COLLECTION_DIR, PAGES_STAMP, self.get_pages_stamp(config))
+                self.collections_built = True
+
+    def get_collection_paths(self) -> List[str]:
+        return [
+            self.NHS_file_manager.PROVIDERS_COLLECTION,
+            self.NHS_file_manager.PROVIDERS_GEO_COLLECTION,
+            self.NHS_file_manager.AGREEMENTS_COLLECTION,
+            self.NHS_file_manager.PROVIDER_AMOUNTS_COLLECTION,
+            self.NHS_file_manager.SERVICE_AMOUNTS_COLLECTION,
+            self.NHS_file_manager.PROVIDERS_SPATIAL_INDEX,
+        ]
+
+    def get_export_paths(self) -> List[str]:
+        if not self.columnar_export:
+            return []
+        from src.PolishNHSDataMongifyer.collection_setup.columnar_export import DATASETS, ColumnarExport
+        export = ColumnarExport(self.NHS_file_manager)
+        return [export.dataset_file(dataset) for dataset in DATASETS]
+
+    def get_inputs_fingerprint(self, config: DBSetupConfig) -> str:
+        input_paths = self.NHS_file_manager.list_agreement_pages()
+        input_paths += [self.NHS_file_manager.PROVIDERS_DATA, self.NHS_file_manager.PROVIDERS_GEO_DATA]
+        return inputs_fingerprint(*input_paths, extra=f"{config.strict_validation}:{config.columnar_export}")
+
+    def get_pages_stamp(self, config: DBSetupConfig) -> str:
+        pages = {os.path.basename(path): file_hash(path) for path in self.NHS_file_manager.list_agreement_pages()}
+        return json_backend.dumps({"strict_validation": config.strict_validation, "pages": pages}, False).decode()
+
+    def get_new_agreement_pages(self, config: DBSetupConfig) -> Optional[List[str]]:
+        """Returns pages added since the collections were built, or None when a page they were built from changed."""
+        recorded = get_stamp(self.NHS_file_manager.COLLECTION_DIR, PAGES_STAMP)
+        if recorded is None:
+            return None
+        recorded = json_backend.loads(recorded)
+        if recorded["strict_validation"] != config.strict_validation:
+            return None
+        current = {os.path.basename(path): path for path in self.NHS_file_manager.list_agreement_pages()}
+        for name, recorded_hash in recorded["pages"].items():
+            if name not in current or file_hash(current[name]) != recorded_hash:
+                return None
+        return [path for name, path in current.items() if name not in recorded["pages"]]
+
+    def collections_are_current(self, fingerprint: str) -> bool:
+        """Whether collections were already built from inputs with exactly this content."""
+        if get_stamp(self.NHS_file_manager.COLLECTION_DIR, COLLECTIONS_STAMP) != fingerprint:
+            return False
+        return self.outputs_exist()
+
+    def outputs_exist(self) -> bool:
+        # Collections of a configuration without agreements are empty lists, but written by their stage nonetheless
+        return (all(is_recorded(path) for path in self.get_collection_paths())
+                and all(os.path.exists(path) for path in self.get_export_paths()))
+
+    def get_agreement_page_results(self, page_paths: List[str] = None) -> List[AgreementPageResult]:
+        """Transforms every agreement page once, or only the given pages, in a process pool when collection_workers > 1.
+
+        Results are returned in page order regardless of the number of workers, so merged collections are identical.
+        """
+        if page_paths is not None:
+            return self._transform_pages(page_paths)
+        if self._page_results is None:
+            self._page_results = self._transform_pages(self.NHS_file_manager.list_agreement_pages())
+        return self._page_results
+
+    def _transform_pages(self, page_paths: List[str]) -> List[AgreementPageResult]:
+        strict = [self.strict_validation] * len(page_paths)
+        if self.collection_workers > 1 and len(page_paths) > 1:
+            # Only imported when needed, loading multiprocessing slows down every short run otherwise
+            from concurrent.futures import ProcessPoolExecutor
+            chunksize = max(1, len(page_paths) // (self.collection_workers * 4))
+            with ProcessPoolExecutor(max_workers=self.collection_workers) as executor:
+                page_results = list(executor.map(transform_agreement_page, page_paths, strict, chunksize=chunksize))
+        else:
+            page_results = list(map(transform_agreement_page, page_paths, strict))
+
+        for result in page_results:
+            for error in result.errors:
+                logger.error(error)
+        return page_results
+
+    def write_collection(self, collection_path, records):
+        json_backend.dump(encode_records(records), collection_path)
 
     def establish_provider_info_collection(self):
 
         providers_path = self.NHS_file_manager.PROVIDERS_DATA
-        agreements_path = self.NHS_file_manager.AGREEMENTS_DATA_DIR
+        collection_path = self.NHS_file_manager.PROVIDERS_COLLECTION
 
         try:
-            provider_file = open(providers_path, "r")
-            providers_data = json.load(provider_file)
-            providers_list = Validation.validate_list(providers_data, Provider)
-        except ValidationError as e:
+            providers_data = FileDataManagement._load_list(providers_path)
+            if self.strict_validation:
+                Validation.validate_list(providers_data, Provider)
+            providers = {provider.code: provider for provider in decode_providers(providers_data)}
+        except (ValidationError, json_backend.JSONDecodeError) as e:
             logger.error(f"Could not validate data of providers for branch {self.branch}: {str(e)}")
             logger.error(traceback.format_exc())
+            return
 
+        provider_agreements = {}
+        for result in self.get_agreement_page_results():
+            for provider_code, agreement_ids in result.provider_agreements.items():
+                provider_agreements.setdefault(provider_code, []).extend(agreement_ids)
 
-        collection_path = self.NHS_file_manager.PROVIDERS_COLLECTION
-        processed_codes_of_entries = []
-
-        for page in os.listdir(agreements_path):
-            try:
-                page_path = os.path.join(agreements_path, page)
-                with open(page_path, "r") as agreements_file:
-                    agreements_list = json.load(agreements_file)
-                    agreements = Validation.validate_list(agreements_list, Agreement)
-                    for agreement in agreements:
-                        try:
-                            provider = self.get_provider_by_code(agreement.attributes.provider_code, providers_list)
-                            if(provider):
-                                with open(collection_path, "r") as f:
-                                    try:
-                                        collection_data = json.load(f)
-                                        validated_collection_entries = Validation.validate_list(collection_data, ProviderInfo)
-                                    except ValidationError:
-                                        collection_entries_list = []
-                                    except json.JSONDecodeError:
-                                        collection_entries_list = []
-
-                                if any(entry_code == agreement.attributes.provider_code for entry_code in processed_codes_of_entries):
-                                    for entry in validated_collection_entries:
-                                        if entry.code == agreement.attributes.provider_code:
-                                            entry.agreements.append(agreement.id)
-                                            break
-                                    collection_entries_list = [e.model_dump() for e in validated_collection_entries]
-                                else:
-                                    try:
-                                        p = ProviderInfo(
-                                        code = provider.attributes.code,
-                                        nip = provider.attributes.nip,
-                                        registry_number = provider.attributes.registry_number,
-                                        name = provider.attributes.name,
-                                        phone = provider.attributes.phone,
-                                        regon = provider.attributes.regon,
-                                        agreements=[agreement.id])
-                                        collection_entries_list.append(p.model_dump())
-                                        processed_codes_of_entries.append(p.code)
-                                    except ValidationError as e:
-                                        logger.error(f"Error while ProviderInfo collection member in branch: {self.branch}: {str(e)}")
-                                        logger.error(traceback.format_exc())
-
-                                with open(collection_path, "w") as f:
-                                    json.dump(collection_entries_list, f, indent=4)
-                                    provider_file.seek(0)
-                        except Exception as e:
-                            logger.error(f"Error while creating agreements collection for branch: {self.branch}: {str(e)}")
-                            logger.error(traceback.format_exc())
-
-            except Exception as e:
-                logger.error(f"Could not establish ProviderInfo collection for branch {self.branch}: {str(e)}")
-                logger.error(traceback.format_exc())
+        collection_entries = build_provider_info(providers, provider_agreements, self.strict_validation)
+
+        try:
+            self.write_collection(collection_path, collection_entries)
+        except Exception as e:
+            logger.error(f"Could not write ProviderInfo collection for branch {self.branch}: {str(e)}")
+            logger.error(traceback.format_exc())
 
     def establish_provider_geo_collection(self):
 
         geodata_path = self.NHS_file_manager.PROVIDERS_GEO_DATA
         collection_file_path = self.NHS_file_manager.PROVIDERS_GEO_COLLECTION
 
-        with open(collection_file_path, "r") as collection_file_read:
-            try:
-                geo_collection_data = json.load(collection_file_read)
-                Validation.validate_list(geo_collection_data, ProviderGeoEntry)
-            except json.JSONDecodeError:
-                geo_collection = []
-
-        with open(geodata_path, "r") as geodata_file:
-            try:
-                geodata = json.load(geodata_file)
-                geodata_list = Validation.validate_list(geodata, ProviderGeoEntry)
-
-                with open(collection_file_path, "w") as collection_file_write:
-                    for entry in geodata_list:
-                        try:
-                            provider_collection_entry = ProviderGeoData(
-                                code = entry.code,
-                                city = entry.geo_data.city,
-                                street = entry.geo_data.street,
-                                building_number=entry.geo_data.housenumber,
-                                district=entry.geo_data.district,
-                                post_code = entry.geo_data.postcode,
-                                voivodeship=entry.branch,
-                                location = { "type": "Point", "coordinates": [entry.geo_data.lon, entry.geo_data.lat]}
-                            )
-                            geo_collection.append(provider_collection_entry.model_dump())
-                            json.dump(geo_collection, collection_file_write, indent=4)
-                            collection_file_write.seek(0)
-                        except ValidationError as e:
-                            logger.error(f"Couldn't create ProviderGeoCollection member for branch {self.branch}: {str(e)}")
-                            logger.error(traceback.format_exc())
-                        except json.JSONDecodeError:
-                            logger.error(f"Couldn't create ProviderGeoCollection member for branch {self.branch}: {str(e)}")
-            except ValidationError as e:
-                logger.error(f"Could not validate data in {geodata_path}")
-                logger.error(traceback.format_exc())
-            except Exception as e:
-                logger.error(f"Unexpected error occurred: {str(e)}")
-                logger.error(traceback.format_exc())
+        try:
+            geodata = FileDataManagement._load_list(geodata_path)
+            if self.strict_validation:
+                Validation.validate_list(geodata, ProviderGeoEntry)
+
+            geo_collection = []
+            for entry in decode_geo_entries(geodata):
+                try:
+                    provider_collection_entry = entry.to_provider_geo_data()
+                    if self.strict_validation:
+                        Validation.validate(provider_collection_entry.to_dict(), ProviderGeoData)
+                    geo_collection.append(provider_collection_entry)
+                except ValueError as e:
+                    logger.error(f"Couldn't create ProviderGeoCollection member for branch {self.branch}: {str(e)}")
+                    logger.error(traceback.format_exc())
+
+            self.write_collection(collection_file_path, geo_collection)
+        except ValidationError as e:
+            logger.error(f"Could not validate data in {geodata_path}")
+            logger.error(traceback.format_exc())
+        except Exception as e:
+            logger.error(f"Unexpected error occurred: {str(e)}")
+            logger.error(traceback.format_exc())
 
     def establish_agreements_collection(self):
+        from src.PolishNHSDataMongifyer.collection_setup.aggregates import AmountAggregator
 
-        data_path = self.NHS_file_manager.AGREEMENTS_DATA_DIR
         collection_file_path = self.NHS_file_manager.AGREEMENTS_COLLECTION
 
-        for page in os.listdir(data_path):
-            page_path = os.path.join(data_path, page)
-            with open(page_path, "r") as page_file:
-                page_data= json.load(page_file)
-                agreements_list = Validation.validate_list(page_data, Agreement)
-                with open(collection_file_path, "r") as collection_file_read:
-                    try:
-                        agreements_collection = json.load(collection_file_read)
-                        Validation.validate_list(agreements_collection, AgreementInfo)
-                    except json.JSONDecodeError:
-                        agreements_collection = []
-                    except ValidationError:
-                        agreements_collection = []
-
-                for agreement in agreements_list:
-                    try:
-                        agreement_info_entry = AgreementInfo(
-                            id = agreement.id,
-                            code = agreement.attributes.code,
-                            origin_code = agreement.attributes.origin_code,
-                            service_type = agreement.attributes.service_type,
-                            service_name = agreement.attributes.service_name,
-                            amount = agreement.attributes.amount,
-                            provider_code= agreement.attributes.provider_code,
-                            year = agreement.attributes.year
-                        )
-
-                        with open(collection_file_path, "w") as collection_file_write:
-                            agreements_collection.append(agreement_info_entry.model_dump())
-                            json.dump(agreements_collection, collection_file_write, indent=4)
-                            collection_file_write.seek(0)
-                    except ValidationError as e:
-                        logger.error(f"Could not create AgreementsCollection member: {str(e)}")
-                        logger.error(traceback.format_exc())
-                    except Exception as e:
-                        logger.error(f"Could not write to agreements collection file: {str(e)}")
-                        logger.error(traceback.format_exc())
+        # Amount aggregates are computed in the same pass, so dashboards do not have to aggregate the whole collection
+        agreements_collection = []
+        amounts = AmountAggregator()
+        for result in self.get_agreement_page_results():
+            agreements_collection.extend(result.agreements)
+            amounts.add_all(result.agreements, self.branch)
+
+        try:
+            self.write_collection(collection_file_path, agreements_collection)
+            save_amounts(self.NHS_file_manager, amounts, self.strict_validation)
+        except Exception as e:
+            logger.error(f"Could not write to agreements collection file: {str(e)}")
+            logger.error(traceback.format_exc())
+
+    def establish_provider_spatial_index(self):
+        from src.PolishNHSDataMongifyer.spatial.provider_index import ProviderSpatialIndex
+
+        index_path = self.NHS_file_manager.PROVIDERS_SPATIAL_INDEX
+
+        try:
+            index = ProviderSpatialIndex.from_collections([(self.NHS_file_manager.PROVIDERS_GEO_COLLECTION,
+                                                            self.NHS_file_manager.AGREEMENTS_COLLECTION)])
+            index.save(index_path)
+        except Exception as e:
+            logger.error(f"Could not build providers spatial index for branch {self.branch}: {str(e)}")
+            logger.error(traceback.format_exc())
+
+    def establish_columnar_export(self):
+        from src.PolishNHSDataMongifyer.collection_setup.columnar_export import ColumnarExport
+        try:
+            ColumnarExport(self.NHS_file_manager).export()
+        except Exception as e:
+            logger.error(f"Could not export collections of branch {self.branch} to columnar files: {str(e)}")
+            logger.error(traceback.format_exc())
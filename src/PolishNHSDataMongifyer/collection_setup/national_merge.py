@@ -0,0 +1,128 @@
+import argparse
+import glob
+import heapq
+import os
+import tempfile
+from itertools import groupby
+from operator import itemgetter
+from pathlib import Path
+from typing import Callable, Iterator, List, Optional
+
+from src.PolishNHSDataMongifyer.serialization import json_backend
+from src.PolishNHSDataMongifyer.serialization.atomic_files import AtomicWriter, get_stamp, inputs_fingerprint, set_stamp
+from src.PolishNHSDataMongifyer.logging.logger import get_logger
+logger = get_logger(__name__)
+
+def merge_providers(entries: List[dict]) -> dict:
+    merged = dict(entries[0])
+    agreements = list(dict.fromkeys(agreement for entry in entries for agreement in (entry.get("agreements") or [])))
+    merged["agreements"] = agreements
+    return merged
+
+def keep_first(entries: List[dict]) -> dict:
+    return entries[0]
+
+# Collection file name -> (deduplication key, merge function)
+NATIONAL_COLLECTIONS = {
+    "ProvidersInfoCollection.json": ("code", merge_providers),
+    "ProvidersGeoCollection.json": ("code", keep_first),
+    "AgreementsCollection.json": ("id", keep_first),
+}
+
+class NationalMerge:
+    """Merges the collections of every branch and service into national collections ready for a single bulk load.
+
+    Entries are read one configuration at a time, spilled to disk as key-sorted runs of at most run_size entries and
+    combined with a k-way merge, so memory does not grow with the number of configurations. Providers appearing in
+    several configurations get the union of their agreements, geo entries and agreements keep the first occurrence.
+    """
+
+    def __init__(self, output_dir_path, year: Optional[int] = None, run_size: int = 100000):
+        self.OUTPUT_DIR_PATH = output_dir_path
+        self.year = year
+        self.run_size = run_size
+        self.NATIONAL_COLLECTION_DIR = os.path.join(output_dir_path, "National", str(year or "AllYears"), "Collections")
+
+    def find_collection_dirs(self) -> List[str]:
+        year = str(self.year) if self.year else "*"
+        pattern = os.path.join(glob.escape(self.OUTPUT_DIR_PATH), "SERVICE[[]*[]]", "*", year, "Collections")
+        return sorted(glob.glob(pattern))
+
+    def run(self):
+        collection_dirs = self.find_collection_dirs()
+        logger.info(f"Merging collections of {len(collection_dirs)} configurations into {self.NATIONAL_COLLECTION_DIR}")
+        Path(self.NATIONAL_COLLECTION_DIR).mkdir(parents=True, exist_ok=True)
+        for file_name, (key, merge_function) in NATIONAL_COLLECTIONS.items():
+            input_paths = [os.path.join(directory, file_name) for directory in collection_dirs]
+            output_path = os.path.join(self.NATIONAL_COLLECTION_DIR, file_name)
+
+            # Collections whose inputs did not change since the last merge are left as they are
+            fingerprint = inputs_fingerprint(*input_paths, extra="\n".join(input_paths))
+            if os.path.exists(output_path) and get_stamp(self.NATIONAL_COLLECTION_DIR, file_name) == fingerprint:
+                logger.info(f"Inputs of {output_path} are unchanged, skipping")
+                continue
+            count = self.merge_collection(input_paths, output_path, key, merge_function)
+            set_stamp(self.NATIONAL_COLLECTION_DIR, file_name, fingerprint)
+            logger.info(f"Wrote {count} entries to {output_path}")
+
+    def merge_collection(self, input_paths: List[str], output_path: str, key: str,
+                         merge_function: Callable[[List[dict]], dict]) -> int:
+        with tempfile.TemporaryDirectory(dir=self.NATIONAL_COLLECTION_DIR) as runs_dir:
+            run_paths = self._write_sorted_runs(input_paths, runs_dir, key)
+            runs = [self._read_run(run_path) for run_path in run_paths]
+            merged = heapq.merge(*runs, key=itemgetter(key))
+            return self._write_array(
+                (merge_function(list(entries)) for _, entries in groupby(merged, key=itemgetter(key))),
+                output_path)
+
+    def _write_sorted_runs(self, input_paths: List[str], runs_dir: str, key: str) -> List[str]:
+        run_paths = []
+        buffer = []
+
+        def flush():
+            buffer.sort(key=itemgetter(key))
+            run_path = os.path.join(runs_dir, f"run{len(run_paths)}.jsonl")
+            with open(run_path, "wb") as run_file:
+                for entry in buffer:
+                    run_file.write(json_backend.dumps(entry, pretty=False))
+                    run_file.write(b"\n")
+            run_paths.append(run_path)
+            buffer.clear()
+
+        for input_path in input_paths:
+            try:
+                buffer.extend(json_backend.load(input_path))
+            except (FileNotFoundError, json_backend.JSONDecodeError) as e:
+                logger.error(f"Skipping collection {input_path}: {str(e)}")
+                continue
+            if len(buffer) >= self.run_size:
+                flush()
+        if buffer:
+            flush()
+        return run_paths
+
+    @staticmethod
+    def _read_run(run_path: str) -> Iterator[dict]:
+        with open(run_path, "rb") as run_file:
+            for line in run_file:
+                yield json_backend.loads(line)
+
+    @staticmethod
+    def _write_array(entries: Iterator[dict], output_path: str) -> int:
+        count = 0
+        with AtomicWriter(output_path) as output_file:
+            output_file.write(b"[")
+            for entry in entries:
+                output_file.write(b",\n" if count else b"\n")
+                output_file.write(json_backend.dumps(entry, pretty=False))
+                count += 1
+            output_file.write(b"\n]\n")
+        return count
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Merge per-configuration collections into national collections")
+    parser.add_argument("output_dir", help="HealthCareData directory")
+    parser.add_argument("--year", type=int, default=None)
+    parser.add_argument("--run-size", type=int, default=100000)
+    args = parser.parse_args()
+    NationalMerge(args.output_dir, year=args.year, run_size=args.run_size).run()
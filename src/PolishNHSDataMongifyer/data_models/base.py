@@ -0,0 +1,10 @@
+from pydantic import BaseModel, ConfigDict
+
+
+class DeferredModel(BaseModel):
+    """Base of the pydantic models of the project.
+
+    Validators and serializers are built on first use instead of at import time, so starting the tool does not pay
+    for models that a run never touches, e.g. the API models when strict validation is off.
+    """
+    model_config = ConfigDict(defer_build=True)
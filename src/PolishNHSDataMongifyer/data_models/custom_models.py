@@ -1,14 +1,35 @@
-from pydantic import BaseModel, Field
+from typing import List, Optional
+from pydantic import Field, model_validator
+from .base import DeferredModel
 from .geoapify_models import Result
 from .nhs_api_models import Branch, ServiceType
 
 
-class DBSetupConfig(BaseModel):
+class DBSetupConfig(DeferredModel):
     branch: Branch
     year: int = 2025
+    year_to: Optional[int] = None
     service_type: ServiceType
+    strict_validation: bool = False
+    collection_workers: int = Field(1, ge=1)
+    columnar_export: bool = False
+    # None lets the agreements page size adapt to the API, see AdaptivePageSize
+    page_size: Optional[int] = Field(None, ge=1)
+    # Continue fetching agreements after the last saved page, e.g. after a fetch that gave up
+    resume: bool = False
 
-class ProviderGeoEntry(BaseModel):
+    @model_validator(mode="after")
+    def check_year_range(self):
+        if self.year_to is not None and self.year_to < self.year:
+            raise ValueError(f"year_to ({self.year_to}) cannot be earlier than year ({self.year})")
+        return self
+
+    @property
+    def years(self) -> List[int]:
+        return list(range(self.year, (self.year_to or self.year) + 1))
+
+class ProviderGeoEntry(DeferredModel):
     code: str = Field(alias="provider-code")
     branch: str = Field(alias="provider-branch")
-    geo_data: Result = Field(alias="geo-data")
\ No newline at end of file
+    geo_data: Result = Field(alias="geo-data")
+    precision: str = Field("address", alias="geo-precision")
\ No newline at end of file
@@ -1,20 +1,21 @@
 from typing import List, Optional
-from pydantic import BaseModel, HttpUrl
+from pydantic import HttpUrl
+from .base import DeferredModel
 
 
-class Bbox(BaseModel):
+class Bbox(DeferredModel):
     lon1: float
     lat1: float
     lon2: float
     lat2: float
 
-class DataSource(BaseModel):
+class DataSource(DeferredModel):
     sourcename: Optional[str]
     attribution: str
     license: str
     url: Optional[HttpUrl] = None
 
-class Timezone(BaseModel):
+class Timezone(DeferredModel):
     name: Optional[str] = None
     offset_STD: str
     offset_STD_seconds: int
@@ -23,7 +24,7 @@ class Timezone(BaseModel):
     abbreviation_STD: str
     abbreviation_DST: str
 
-class Rank(BaseModel):
+class Rank(DeferredModel):
     importance: Optional[float] = None
     popularity: Optional[float] = None
     confidence: float
@@ -32,7 +33,7 @@ class Rank(BaseModel):
     confidence_building_level: float
     match_type: str
 
-class QueryParsed(BaseModel):
+class QueryParsed(DeferredModel):
     housenumber: Optional[str] = None
     street: Optional[str] = None
     postcode: Optional[str] = None
@@ -41,7 +42,7 @@ class QueryParsed(BaseModel):
     state: Optional[str] = None
     expected_type: Optional[str] = None
 
-class Query(BaseModel):
+class Query(DeferredModel):
     text: Optional[str] = None 
     housenumber: Optional[str] = None 
     street: Optional[str] = None
@@ -51,7 +52,7 @@ class Query(BaseModel):
     state: Optional[str] = None
     parsed: Optional[QueryParsed] = None
 
-class Result(BaseModel):
+class Result(DeferredModel):
     datasource: DataSource
     name: Optional[str] = None
     country: Optional[str] = None
@@ -77,6 +78,6 @@ class Result(BaseModel):
     rank: Optional[Rank] = None
     place_id: Optional[str] = None
 
-class Response(BaseModel):
+class Response(DeferredModel):
     results: List[Result]
     query: Query
\ No newline at end of file
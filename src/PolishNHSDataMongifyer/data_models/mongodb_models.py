@@ -1,8 +1,9 @@
 from typing import List, Optional, Tuple
-from pydantic import BaseModel, PositiveFloat
+from pydantic import PositiveFloat
+from .base import DeferredModel
 
 
-class AgreementInfo(BaseModel):
+class AgreementInfo(DeferredModel):
     id: str
     code: str
     origin_code: str
@@ -12,7 +13,7 @@ class AgreementInfo(BaseModel):
     provider_code: str
     year: int
 
-class ProviderInfo(BaseModel):
+class ProviderInfo(DeferredModel):
     code: str
     nip: str
     regon: str
@@ -21,11 +22,11 @@ class ProviderInfo(BaseModel):
     phone: Optional[str]
     agreements: Optional[List[str]]
 
-class Location(BaseModel):
+class Location(DeferredModel):
     type: str = "Point"
     coordinates: Tuple[ float, float ] 
 
-class ProviderGeoData(BaseModel):
+class ProviderGeoData(DeferredModel):
     code: str
     city: str
     street: str
@@ -33,4 +34,21 @@ class ProviderGeoData(BaseModel):
     district: Optional[str]
     post_code: str
     voivodeship: str
-    location: Location
\ No newline at end of file
+    location: Location
+    precision: str = "address"
+
+class ProviderAmounts(DeferredModel):
+    provider_code: str
+    total_amount: float
+    agreements_count: int
+    min_amount: float
+    max_amount: float
+
+class ServiceAmounts(DeferredModel):
+    branch: str
+    service_type: str
+    year: int
+    total_amount: float
+    agreements_count: int
+    min_amount: float
+    max_amount: float
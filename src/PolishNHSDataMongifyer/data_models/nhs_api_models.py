@@ -1,7 +1,8 @@
 from datetime import datetime
 from enum import Enum
 from typing import List, Literal, Optional, Union
-from pydantic import BaseModel, Field, HttpUrl, PositiveFloat, PositiveInt
+from pydantic import Field, HttpUrl, PositiveFloat, PositiveInt
+from .base import DeferredModel
 
 
 class Branch(str, Enum):
@@ -22,7 +23,7 @@ class Branch(str, Enum):
     Wielkopolskie: str = "15"
     Zachodniopomorskie: str = "16"
 
-class AgreementAttributes(BaseModel):
+class AgreementAttributes(DeferredModel):
     """Represents the attributes of an agreement."""
     code: Optional[str]
     technical_code: Optional[str] = Field(alias="technical-code")
@@ -44,7 +45,7 @@ class AgreementAttributes(BaseModel):
         """Configuration for field aliases and other settings."""
         populate_by_name = True
 
-class PageLinks(BaseModel):
+class PageLinks(DeferredModel):
     first_page: Optional[HttpUrl] = Field(alias="first")
     prev_page: Optional[HttpUrl] = Field(alias="prev")
     self_page: Optional[HttpUrl] = Field(alias="self") 
@@ -52,10 +53,10 @@ class PageLinks(BaseModel):
     last_page: Optional[HttpUrl] = Field(alias="last") 
     related_pages: Optional[HttpUrl] = Field(alias="related") 
 
-class AgreementLinks(BaseModel):
+class AgreementLinks(DeferredModel):
     related_pages: Optional[HttpUrl] = Field(None, alias="related") 
 
-class Agreement(BaseModel):
+class Agreement(DeferredModel):
     """Represents an agreement."""
     id: str
     type: str = "agreement"
@@ -66,10 +67,10 @@ class Agreement(BaseModel):
         """Configuration for the Agreement model."""
         populate_by_name = True
 
-class AgreementsData(BaseModel):
+class AgreementsData(DeferredModel):
     agreements: List[Agreement]
 
-class PageMeta(BaseModel):
+class PageMeta(DeferredModel):
     context: Optional[HttpUrl] = Field(alias="@context")
     count: Optional[PositiveInt]
     page: Optional[PositiveInt]
@@ -86,12 +87,12 @@ class PageMeta(BaseModel):
     is_part_of: Optional[str] = Field(alias="is-part-of")
     version: Optional[str]
 
-class AgreementsPage(BaseModel):
+class AgreementsPage(DeferredModel):
     meta: PageMeta
     links: Optional[PageLinks]
     data: AgreementsData
 
-class ProviderAttributes(BaseModel):
+class ProviderAttributes(DeferredModel):
     branch: Optional[Branch]
     code: Optional[str]
     name: Optional[str]
@@ -104,14 +105,14 @@ class ProviderAttributes(BaseModel):
     phone: Optional[str]
     commune: Optional[str]
 
-class Provider(BaseModel):
+class Provider(DeferredModel):
     type: str = "dictionary-provider-entry"
     attributes: ProviderAttributes
 
-class ProviderData(BaseModel):
+class ProviderData(DeferredModel):
     entries: List[Provider]
 
-class ProvidersPage(BaseModel):
+class ProvidersPage(DeferredModel):
     meta: PageMeta
     links: Optional[PageLinks]
     data: ProviderData
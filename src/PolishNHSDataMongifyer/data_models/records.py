@@ -0,0 +1,271 @@
+"""Lightweight record types used inside the pipeline.
+
+Pydantic models in nhs_api_models, geoapify_models and mongodb_models describe the API boundary and the collection
+documents. Building them for every agreement of a large branch dominates the cost of collection setup, so the
+pipeline decodes saved JSON straight into the slotted dataclasses below and only goes through pydantic when
+strict validation is requested.
+"""
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+def _require(record, fields) -> None:
+    missing = [field for field in fields if getattr(record, field) is None]
+    if missing:
+        raise ValueError(f"{type(record).__name__} is missing required fields: {', '.join(missing)}")
+
+@dataclass(slots=True)
+class AgreementInfoRecord:
+    id: str
+    code: str
+    origin_code: str
+    service_type: str
+    service_name: str
+    amount: float
+    provider_code: str
+    year: int
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "code": self.code,
+            "origin_code": self.origin_code,
+            "service_type": self.service_type,
+            "service_name": self.service_name,
+            "amount": self.amount,
+            "provider_code": self.provider_code,
+            "year": self.year,
+        }
+
+@dataclass(slots=True)
+class ProviderInfoRecord:
+    code: str
+    nip: str
+    regon: str
+    registry_number: str
+    name: str
+    phone: Optional[str]
+    agreements: List[str]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "code": self.code,
+            "nip": self.nip,
+            "regon": self.regon,
+            "registry_number": self.registry_number,
+            "name": self.name,
+            "phone": self.phone,
+            "agreements": self.agreements,
+        }
+
+@dataclass(slots=True)
+class ProviderGeoDataRecord:
+    code: str
+    city: str
+    street: str
+    building_number: str
+    district: Optional[str]
+    post_code: str
+    voivodeship: str
+    lon: float
+    lat: float
+    precision: str
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "code": self.code,
+            "city": self.city,
+            "street": self.street,
+            "building_number": self.building_number,
+            "district": self.district,
+            "post_code": self.post_code,
+            "voivodeship": self.voivodeship,
+            "location": {"type": "Point", "coordinates": [self.lon, self.lat]},
+            "precision": self.precision,
+        }
+
+@dataclass(slots=True)
+class AgreementRecord:
+    id: str
+    code: Optional[str]
+    technical_code: Optional[str]
+    origin_code: Optional[str]
+    service_type: Optional[str]
+    service_name: Optional[str]
+    amount: Optional[float]
+    updated_at: Optional[str]
+    provider_code: Optional[str]
+    provider_nip: Optional[str]
+    provider_regon: Optional[str]
+    provider_registry_number: Optional[str]
+    provider_name: Optional[str]
+    provider_place: Optional[str]
+    year: Optional[int]
+    branch: Optional[str]
+    related: Optional[str]
+
+    @classmethod
+    def from_api(cls, data: Dict[str, Any]) -> "AgreementRecord":
+        """Decodes an agreement in the aliased form returned by the NFZ API and saved in agreement pages."""
+        attributes = data["attributes"]
+        links = data.get("links") or {}
+        return cls(
+            data["id"],
+            attributes.get("code"),
+            attributes.get("technical-code"),
+            attributes.get("origin-code"),
+            attributes.get("service-type"),
+            attributes.get("service-name"),
+            attributes.get("amount"),
+            attributes.get("updated-at"),
+            attributes.get("provider-code"),
+            attributes.get("provider-nip"),
+            attributes.get("provider-regon"),
+            attributes.get("provider-registry-number"),
+            attributes.get("provider-name"),
+            attributes.get("provider-place"),
+            attributes.get("year"),
+            attributes.get("branch"),
+            links.get("related"),
+        )
+
+    def to_api(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "type": "agreement",
+            "attributes": {
+                "code": self.code,
+                "technical-code": self.technical_code,
+                "origin-code": self.origin_code,
+                "service-type": self.service_type,
+                "service-name": self.service_name,
+                "amount": self.amount,
+                "updated-at": self.updated_at,
+                "provider-code": self.provider_code,
+                "provider-nip": self.provider_nip,
+                "provider-regon": self.provider_regon,
+                "provider-registry-number": self.provider_registry_number,
+                "provider-name": self.provider_name,
+                "provider-place": self.provider_place,
+                "year": self.year,
+                "branch": self.branch,
+            },
+            "links": {"related": self.related},
+        }
+
+    def to_agreement_info(self) -> AgreementInfoRecord:
+        info = AgreementInfoRecord(self.id, self.code, self.origin_code, self.service_type, self.service_name,
+                                   self.amount, self.provider_code, self.year)
+        _require(info, ("code", "origin_code", "service_type", "service_name", "amount", "provider_code", "year"))
+        # Amounts the API sends as strings are converted like the pydantic model does, others fail only this agreement
+        try:
+            info.amount = float(info.amount)
+        except (TypeError, ValueError):
+            raise ValueError(f"Agreement {self.id} has non-numeric amount: {self.amount!r}") from None
+        if info.amount <= 0:
+            raise ValueError(f"Agreement {self.id} has non-positive amount: {info.amount}")
+        return info
+
+@dataclass(slots=True)
+class ProviderRecord:
+    code: Optional[str]
+    branch: Optional[str]
+    name: Optional[str]
+    nip: Optional[str]
+    regon: Optional[str]
+    registry_number: Optional[str]
+    post_code: Optional[str]
+    street: Optional[str]
+    place: Optional[str]
+    phone: Optional[str]
+    commune: Optional[str]
+
+    @classmethod
+    def from_api(cls, data: Dict[str, Any]) -> "ProviderRecord":
+        """Decodes a provider in the aliased form returned by the NFZ API and saved in ProvidersData.json."""
+        attributes = data["attributes"]
+        return cls(
+            attributes.get("code"),
+            attributes.get("branch"),
+            attributes.get("name"),
+            attributes.get("nip"),
+            attributes.get("regon"),
+            attributes.get("registry-number"),
+            attributes.get("post-code"),
+            attributes.get("street"),
+            attributes.get("place"),
+            attributes.get("phone"),
+            attributes.get("commune"),
+        )
+
+    def to_api(self) -> Dict[str, Any]:
+        return {
+            "type": "dictionary-provider-entry",
+            "attributes": {
+                "branch": self.branch,
+                "code": self.code,
+                "name": self.name,
+                "nip": self.nip,
+                "regon": self.regon,
+                "registry-number": self.registry_number,
+                "post-code": self.post_code,
+                "street": self.street,
+                "place": self.place,
+                "phone": self.phone,
+                "commune": self.commune,
+            },
+        }
+
+    def to_provider_info(self, agreements: List[str]) -> ProviderInfoRecord:
+        info = ProviderInfoRecord(self.code, self.nip, self.regon, self.registry_number, self.name, self.phone,
+                                  agreements)
+        _require(info, ("code", "nip", "regon", "registry_number", "name"))
+        return info
+
+@dataclass(slots=True)
+class ProviderGeoEntryRecord:
+    code: str
+    branch: str
+    city: str
+    street: str
+    housenumber: str
+    district: Optional[str]
+    postcode: str
+    lon: float
+    lat: float
+    precision: str
+
+    @classmethod
+    def from_api(cls, data: Dict[str, Any]) -> "ProviderGeoEntryRecord":
+        """Decodes an entry of ProvidersGeographicalData.json."""
+        geo_data = data["geo-data"]
+        return cls(
+            data["provider-code"],
+            data["provider-branch"],
+            geo_data.get("city"),
+            geo_data.get("street"),
+            geo_data.get("housenumber"),
+            geo_data.get("district"),
+            geo_data.get("postcode"),
+            geo_data["lon"],
+            geo_data["lat"],
+            data.get("geo-precision", "address"),
+        )
+
+    def to_provider_geo_data(self) -> ProviderGeoDataRecord:
+        geo = ProviderGeoDataRecord(self.code, self.city, self.street, self.housenumber, self.district,
+                                    self.postcode, self.branch, float(self.lon), float(self.lat),
+                                    self.precision)
+        _require(geo, ("code", "city", "street", "building_number", "post_code", "voivodeship"))
+        return geo
+
+def decode_agreements(items: List[Dict[str, Any]]) -> List[AgreementRecord]:
+    return [AgreementRecord.from_api(item) for item in items]
+
+def decode_providers(items: List[Dict[str, Any]]) -> List[ProviderRecord]:
+    return [ProviderRecord.from_api(item) for item in items]
+
+def decode_geo_entries(items: List[Dict[str, Any]]) -> List[ProviderGeoEntryRecord]:
+    return [ProviderGeoEntryRecord.from_api(item) for item in items]
+
+def encode_records(records) -> List[Dict[str, Any]]:
+    return [record.to_dict() for record in records]
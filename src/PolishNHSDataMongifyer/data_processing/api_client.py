@@ -1,21 +1,49 @@
 
+import threading
+import time
 import traceback
-import requests
+from src.PolishNHSDataMongifyer.serialization import json_backend
+from src.PolishNHSDataMongifyer.data_processing.http_cache import HTTPResponseCache, get_default_cache
 from src.PolishNHSDataMongifyer.logging.logger import get_logger
 logger = get_logger(__name__)
 
+class RateLimiter:
+    """Spaces out requests made from any number of threads by at least min_interval seconds."""
+
+    def __init__(self, min_interval: float):
+        self.min_interval = min_interval
+        self._lock = threading.Lock()
+        self._next_slot = 0.0
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.min_interval
+        if slot > now:
+            time.sleep(slot - now)
+
 class APIClient:
-    def __init__(self, base_url):
+    def __init__(self, base_url, rate_limiter: RateLimiter = None, cache: HTTPResponseCache = None):
         self.base_url = base_url
+        self.rate_limiter = rate_limiter
+        self.cache = cache if cache is not None else get_default_cache()
 
     def fetch(self, endpoint, params=None):
         url = f"{self.base_url}/{endpoint}"
         full_url = f"{url}?{self._encode_params(params)}" if params else url
-        logger.info("Making request to: %s", full_url)
+        # Imported on first use, requests accounts for a large part of the startup time
+        import requests
         try:
-            response = requests.get(url, params=params)
+            if self.cache:
+                return self._fetch_cached(endpoint, url, full_url, params)
+            response = self._get(url, full_url, params)
             response.raise_for_status()
-            return response.json()
+            return json_backend.loads(response.content)
+        except requests.exceptions.HTTPError as e:
+            # Callers decide whether an error status is a failure, e.g. page sizes rejected while probing are not
+            logger.info("Request to %s returned an error status: %s", full_url, e)
+            raise
         except requests.exceptions.RequestException as e:
             logger.error("Failed to fetch data from %s: %s", full_url, e)
             raise
@@ -23,7 +51,37 @@ class APIClient:
             logger.error(f"Unexpected error occurred: {str(e)}")
             logger.error(traceback.format_exc())
 
-        
+
+    def _get(self, url, full_url, params, headers=None):
+        if self.rate_limiter:
+            self.rate_limiter.wait()
+        logger.info("Making request to: %s", full_url)
+        import requests
+        return requests.get(url, params=params, headers=headers)
+
+    def _fetch_cached(self, endpoint, url, full_url, params):
+        key = self.cache.make_key(url, params)
+        cached = self.cache.get(key)
+        if cached and self.cache.is_fresh(cached, endpoint):
+            logger.info("Using cached response for: %s", full_url)
+            return cached.json()
+
+        headers = {}
+        if cached and cached.etag:
+            headers["If-None-Match"] = cached.etag
+        if cached and cached.last_modified:
+            headers["If-Modified-Since"] = cached.last_modified
+
+        response = self._get(url, full_url, params, headers=headers)
+        if cached and response.status_code == 304:
+            logger.info("Cached response is still valid for: %s", full_url)
+            return self.cache.revalidated(cached).json()
+        response.raise_for_status()
+        # Decoded before storing, so that truncated or malformed bodies are not served from the cache later
+        data = json_backend.loads(response.content)
+        self.cache.store(key, response.content, response.headers)
+        return data
+
     def _encode_params(self, params):
         if params:
             from urllib.parse import urlencode
@@ -31,4 +89,6 @@ class APIClient:
         return ""
 
 NFZAPI_BASE_URL = "https://api.nfz.gov.pl/app-umw-api"
-GEOAPIFY_BASE_URL = "https://api.geoapify.com/v1"
\ No newline at end of file
+GEOAPIFY_BASE_URL = "https://api.geoapify.com/v1"
+
+NFZAPI_RATE_LIMITER = RateLimiter(min_interval=0.11)
\ No newline at end of file
@@ -1,46 +1,60 @@
-import json
 import os
 from pathlib import Path
 import traceback
+from typing import Dict, List, Tuple
 
 from pydantic import ValidationError
 from src.PolishNHSDataMongifyer.data_models.custom_models import ProviderGeoEntry
 from src.PolishNHSDataMongifyer.data_models.geoapify_models import Result
-from src.PolishNHSDataMongifyer.data_models.nhs_api_models import Branch, Provider, ServiceType
+from src.PolishNHSDataMongifyer.data_models.nhs_api_models import Branch, ServiceType
+from src.PolishNHSDataMongifyer.data_models.records import ProviderRecord, decode_geo_entries
+from src.PolishNHSDataMongifyer.serialization import json_backend
 from src.PolishNHSDataMongifyer.validation.validation import Validation
 
 from src.PolishNHSDataMongifyer.logging.logger import get_logger
 logger = get_logger(__name__)
 
 class FileDataManagement:
-    def __init__(self, branch, service: ServiceType, path: Path):
+    def __init__(self, branch, service: ServiceType, path: Path, year: int = 2025):
+        self.branch = branch
+        self.service = service
+        self.path = path
+        self.YEAR = year
+
         self.FILE_DIR = os.path.dirname(path)
         self.OUTPUT_DIR_PATH = os.path.join(self.FILE_DIR, "HealthCareData")
         self.SERVICE_PATH = os.path.join(self.OUTPUT_DIR_PATH, f"SERVICE[{service.name}]")
         self.BRANCH_PATH = os.path.join(self.SERVICE_PATH, self.get_voivodeship_name(branch))
 
+        # Providers and their geographical data do not depend on the year, so they are shared by all years of a branch
         self.DATA_DIR = os.path.join(self.BRANCH_PATH, "Data" )
-        self.AGREEMENTS_DATA_DIR = os.path.join(self.DATA_DIR, "Agreements")
         self.PROVIDERS_DATA = os.path.join(self.DATA_DIR, "ProvidersData.json")
         self.PROVIDERS_GEO_DATA = os.path.join(self.DATA_DIR, "ProvidersGeographicalData.json")
 
-        self.COLLECTION_DIR = os.path.join(self.BRANCH_PATH, "Collections" )
+        self.YEAR_PATH = os.path.join(self.BRANCH_PATH, str(year))
+        self.YEAR_DATA_DIR = os.path.join(self.YEAR_PATH, "Data")
+        self.AGREEMENTS_DATA_DIR = os.path.join(self.YEAR_DATA_DIR, "Agreements")
+
+        self.COLLECTION_DIR = os.path.join(self.YEAR_PATH, "Collections" )
         self.PROVIDERS_COLLECTION = os.path.join(self.COLLECTION_DIR, "ProvidersInfoCollection.json")
         self.PROVIDERS_GEO_COLLECTION = os.path.join(self.COLLECTION_DIR, "ProvidersGeoCollection.json")
         self.AGREEMENTS_COLLECTION = os.path.join(self.COLLECTION_DIR, "AgreementsCollection.json")
+        self.PROVIDER_AMOUNTS_COLLECTION = os.path.join(self.COLLECTION_DIR, "ProviderAmountsCollection.json")
+        self.SERVICE_AMOUNTS_COLLECTION = os.path.join(self.COLLECTION_DIR, "ServiceAmountsCollection.json")
+        self.PROVIDERS_SPATIAL_INDEX = os.path.join(self.COLLECTION_DIR, "ProvidersSpatialIndex.bin")
 
     def setup_file_structure(self):
         try:
             Path(self.OUTPUT_DIR_PATH).mkdir(parents=True, exist_ok=True)
             Path(self.DATA_DIR).mkdir(parents=True, exist_ok=True)
+            Path(self.YEAR_DATA_DIR).mkdir(parents=True, exist_ok=True)
             Path(self.COLLECTION_DIR).mkdir(parents=True, exist_ok=True)
             
-            Path(self.PROVIDERS_COLLECTION).touch()
-            Path(self.PROVIDERS_GEO_COLLECTION).touch()
-            Path(self.AGREEMENTS_COLLECTION).touch()
-
-            Path(self.PROVIDERS_DATA).touch()
-            Path(self.PROVIDERS_GEO_DATA).touch()
+            # Existing files are left untouched, so their modification time still tells when their content changed
+            for file_path in (self.PROVIDERS_COLLECTION, self.PROVIDERS_GEO_COLLECTION, self.AGREEMENTS_COLLECTION,
+                              self.PROVIDERS_DATA, self.PROVIDERS_GEO_DATA):
+                if not os.path.exists(file_path):
+                    Path(file_path).touch()
 
             Path(self.AGREEMENTS_DATA_DIR).mkdir(parents=True, exist_ok=True)
             
@@ -48,6 +62,50 @@ class FileDataManagement:
             logger.error(f"Unexpected error occurred during file structure setup: {str(e)}")
             logger.error(traceback.format_exc())
 
+    def for_year(self, year: int) -> "FileDataManagement":
+        return FileDataManagement(self.branch, self.service, self.path, year)
+
+    @staticmethod
+    def agreement_page_offset(filename: str):
+        """Returns the offset of the first agreement in a page file, or None for other files.
+
+        Pages saved before the page size became adaptive are named Page{number}_limit{limit}.json.
+        """
+        name, extension = os.path.splitext(filename)
+        if extension != ".json":
+            return None
+        if name.startswith("Offset") and name[len("Offset"):].isdigit():
+            return int(name[len("Offset"):])
+        if name.startswith("Page"):
+            page_number, _, limit = name[len("Page"):].partition("_limit")
+            if page_number.isdigit() and limit.isdigit():
+                return (int(page_number) - 1) * int(limit)
+        return None
+
+    def list_agreement_pages(self) -> List[str]:
+        """Returns paths of saved agreement pages ordered by offset."""
+        return self.agreement_pages_in(self.AGREEMENTS_DATA_DIR)
+
+    @staticmethod
+    def agreement_pages_in(directory) -> List[str]:
+        pages = [page for page in os.listdir(directory) if FileDataManagement.agreement_page_offset(page) is not None]
+        pages.sort(key=FileDataManagement.agreement_page_offset)
+        return [os.path.join(directory, page) for page in pages]
+
+    def get_saved_provider_codes(self) -> List[str]:
+        return [entry["attributes"]["code"] for entry in self._load_list(self.PROVIDERS_DATA)]
+
+    def get_geocoded_provider_codes(self, precision: str = None) -> List[str]:
+        return [entry["provider-code"] for entry in self._load_list(self.PROVIDERS_GEO_DATA)
+                if precision is None or entry.get("geo-precision", "address") == precision]
+
+    @staticmethod
+    def _load_list(file_path) -> list:
+        try:
+            return json_backend.load(file_path)
+        except (FileNotFoundError, json_backend.JSONDecodeError):
+            return []
+
     @staticmethod
     def get_voivodeship_name(branch_code: str):
         for name, code in Branch.__members__.items():
@@ -55,31 +113,74 @@ class FileDataManagement:
                 return name
         raise ValueError(f"Could not find proper voivodeship name for branch code: '{branch_code}'")
 
-    def save_agreements_page(self, page_data, page_number: int, request_page_limit: int):
+    def save_agreements_page(self, page_data, offset: int) -> str:
+        """Saves agreements starting at the given offset, file names do not depend on the page size used to fetch them."""
+        filename = f"Offset{offset}.json"
         try:
-            filename = f"Page{page_number}_limit{request_page_limit}.json"
             file_path = os.path.join(self.AGREEMENTS_DATA_DIR, filename)
-            
-            with open(file_path, "w") as file:
-                json.dump(page_data, file, indent=4, default=Validation.json_serial)
+            json_backend.dump(page_data, file_path)
         except Exception as e:
             logger.error(f"Unexpected error occurred while creating {filename} file: {str(e)}")
             logger.error(traceback.format_exc())
+        return filename
+
+    def remove_stale_agreement_pages(self, keep: List[str]):
+        """Removes pages that were not written by the last complete fetch, e.g. pages saved with another page size."""
+        for page_path in self.list_agreement_pages():
+            if os.path.basename(page_path) not in keep:
+                os.remove(page_path)
+                logger.info(f"Removed stale agreements page {page_path}")
+
+    def get_agreement_page_sizes(self) -> Dict[int, int]:
+        """Returns the page size the saved pages were fetched with, keyed by their offset.
 
-    def save_provider(self, provider: Provider):
+        A page followed by another one was full, so its size is the distance to the next offset. The last page is
+        assumed to have the size of the one before it when its agreements fit into it.
+        """
+        pages = self.list_agreement_pages()
+        offsets = [self.agreement_page_offset(os.path.basename(page_path)) for page_path in pages]
+        sizes = {offset: next_offset - offset for offset, next_offset in zip(offsets, offsets[1:])}
+        if len(offsets) > 1:
+            previous_size = sizes[offsets[-2]]
+            if offsets[-1] % previous_size == 0 and len(self._load_list(pages[-1])) <= previous_size:
+                sizes[offsets[-1]] = previous_size
+        return {offset: size for offset, size in sizes.items() if size > 0 and offset % size == 0}
+
+    def remove_overlapping_agreement_pages(self, keep: List[str], start: int, end: int):
+        """Removes pages not in keep holding agreements between the offsets start and end, which keep holds again.
+
+        Pages of earlier fetches outside that range are kept, so the saved pages still cover every offset once.
+        """
+        for page_path in self.list_agreement_pages():
+            name = os.path.basename(page_path)
+            page_start = self.agreement_page_offset(name)
+            if name in keep or page_start >= end:
+                continue
+            if page_start >= start or page_start + len(self._load_list(page_path)) > start:
+                os.remove(page_path)
+                logger.info(f"Removed agreements page {page_path} overlapping the fetched pages")
+
+    def get_agreements_resume_offset(self, alignment: int = 1) -> int:
+        """Returns the offset of the last saved page starting at a multiple of alignment, to continue fetching from.
+
+        That page is fetched again since it may have been cut short, pages saved after it are removed so the
+        refetched ones do not overlap them.
+        """
+        offsets = [self.agreement_page_offset(os.path.basename(page_path)) for page_path in self.list_agreement_pages()]
+        offset = max((offset for offset in offsets if offset % alignment == 0), default=0)
+        for page_path in self.list_agreement_pages():
+            if self.agreement_page_offset(os.path.basename(page_path)) > offset:
+                os.remove(page_path)
+        return offset
+
+    def save_providers(self, providers: List[ProviderRecord]):
+        """Appends providers to the providers file, written once for the whole batch."""
+        if not providers:
+            return
         try:
-            with open(self.PROVIDERS_DATA, "r") as file:
-                try:
-                    providers_list = json.load(file)
-                    Validation.validate_list(providers_list, Provider)
-                except json.JSONDecodeError:
-                    providers_list = []
-                except ValidationError:
-                    providers_list = []
-
-            providers_list.append(provider.model_dump(by_alias=True))
-            with open(self.PROVIDERS_DATA, "w") as file:
-                json.dump(providers_list, file, ensure_ascii=False, indent=4)
+            providers_list = self._load_list(self.PROVIDERS_DATA)
+            providers_list.extend(provider.to_api() for provider in providers)
+            json_backend.dump(providers_list, self.PROVIDERS_DATA)
 
         except ValueError as e:
             logger.error(f"ValueError occurred: {e}")
@@ -87,26 +188,33 @@ class FileDataManagement:
             logger.error(f"Unexpected error occurred: {str(e)}")
             logger.error(traceback.format_exc())
     
-    def save_provider_geo_data(self, provider: Provider, geo_data: Result):
+    def save_providers_geo_data(self, geocoded: List[Tuple[ProviderRecord, Result, str]],
+                                strict_validation: bool = False):
+        """Saves (provider, geo data, precision) results to the geo file, written once for the whole batch."""
+        if not geocoded:
+            return
         try:
             file_path = self.PROVIDERS_GEO_DATA
-            with open(file_path, "r") as file:
-                try:
-                    providers_list = json.load(file)
+            providers_list = self._load_list(file_path)
+            try:
+                if strict_validation:
                     Validation.validate_list(providers_list, ProviderGeoEntry)
-                except json.JSONDecodeError:
-                    providers_list = []
-                except ValidationError:
-                    providers_list = []
-
-            provider_entry = {
-                "provider-code": provider.attributes.code,
-                "provider-branch": provider.attributes.branch,
-                "geo-data": geo_data.model_dump(by_alias=True)
-            }
-            providers_list.append(provider_entry)
-            with open(file_path, "w") as file:
-                json.dump(providers_list, file, ensure_ascii=False, indent=4, default=Validation.json_serial)
+                decode_geo_entries(providers_list)
+            except (ValidationError, KeyError, TypeError) as e:
+                # Providers geocoded earlier are kept instead of being dropped together with the invalid entries
+                logger.error(f"Saved geographical data in {file_path} is invalid: {str(e)}")
+
+            provider_entries = [{
+                "provider-code": provider.code,
+                "provider-branch": provider.branch,
+                "geo-data": geo_data.model_dump(mode="json", by_alias=True),
+                "geo-precision": precision
+            } for provider, geo_data, precision in geocoded]
+            # A more precise location replaces the one found earlier, e.g. by the offline pre-pass
+            replaced_codes = {entry["provider-code"] for entry in provider_entries}
+            providers_list = [entry for entry in providers_list if entry.get("provider-code") not in replaced_codes]
+            providers_list.extend(provider_entries)
+            json_backend.dump(providers_list, file_path)
 
         except ValueError as e:
             logger.error(f"ValueError occurred: {e}")
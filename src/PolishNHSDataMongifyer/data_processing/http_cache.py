@@ -0,0 +1,180 @@
+import gzip
+import hashlib
+import os
+import threading
+import time
+import traceback
+from pathlib import Path
+from typing import Dict, Optional
+from urllib.parse import urlencode
+
+from src.PolishNHSDataMongifyer.serialization import json_backend
+from src.PolishNHSDataMongifyer.serialization.atomic_files import temporary_path
+from src.PolishNHSDataMongifyer.logging.logger import get_logger
+logger = get_logger(__name__)
+
+# Parameters that do not change the response, kept out of cache keys so that secrets are never written to disk
+EXCLUDED_PARAMS = {"apiKey"}
+
+class CachedResponse:
+    def __init__(self, key: str, meta: dict, body: bytes):
+        self.key = key
+        self.meta = meta
+        self.body = body
+
+    @property
+    def etag(self) -> Optional[str]:
+        return self.meta.get("etag")
+
+    @property
+    def last_modified(self) -> Optional[str]:
+        return self.meta.get("last_modified")
+
+    def json(self):
+        return json_backend.loads(self.body)
+
+class HTTPResponseCache:
+    """Disk cache of HTTP response bodies, keyed on endpoint url and normalised request parameters.
+
+    Bodies are stored gzip-compressed next to a small metadata file holding ETag/Last-Modified validators and the
+    storage time. Entries older than their TTL are revalidated with a conditional request when validators are known,
+    and least recently used entries are evicted once max_size bytes are exceeded. The modification time of a body
+    is its last access time, so cache hits only touch it instead of rewriting the metadata.
+    """
+
+    def __init__(self, cache_dir: Path, ttl: int = 86400, max_size: int = 512 * 1024 * 1024,
+                 endpoint_ttls: Dict[str, int] = None):
+        self.cache_dir = Path(cache_dir)
+        self.ttl = ttl
+        self.max_size = max_size
+        self.endpoint_ttls = endpoint_ttls or {}
+        self._lock = threading.Lock()
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self._sizes: Dict[str, int] = {}
+        self._last_access: Dict[str, float] = {}
+        self._scan()
+
+    @classmethod
+    def from_env(cls) -> Optional["HTTPResponseCache"]:
+        """Builds the cache from HTTP_CACHE_* environment variables, returns None when HTTP_CACHE_DIR is not set.
+
+        HTTP_CACHE_ENDPOINT_TTLS overrides the default TTL per endpoint, e.g. "providers=604800,geocode/search=2592000".
+        """
+        cache_dir = os.getenv("HTTP_CACHE_DIR")
+        if not cache_dir:
+            return None
+        endpoint_ttls = {}
+        for entry in filter(None, os.getenv("HTTP_CACHE_ENDPOINT_TTLS", "").split(",")):
+            endpoint, _, ttl = entry.partition("=")
+            endpoint_ttls[endpoint.strip()] = int(ttl)
+        return cls(
+            cache_dir,
+            ttl=int(os.getenv("HTTP_CACHE_TTL", 86400)),
+            max_size=int(os.getenv("HTTP_CACHE_MAX_SIZE_MB", 512)) * 1024 * 1024,
+            endpoint_ttls=endpoint_ttls,
+        )
+
+    @staticmethod
+    def make_key(url: str, params: dict = None) -> str:
+        normalised = sorted((str(k), str(v)) for k, v in (params or {}).items()
+                            if k not in EXCLUDED_PARAMS and v is not None)
+        return hashlib.sha256(f"{url}?{urlencode(normalised)}".encode("utf-8")).hexdigest()
+
+    def ttl_for(self, endpoint: str) -> int:
+        return self.endpoint_ttls.get(endpoint, self.ttl)
+
+    def is_fresh(self, entry: CachedResponse, endpoint: str) -> bool:
+        return time.time() - entry.meta["stored_at"] < self.ttl_for(endpoint)
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        meta_path, body_path = self._paths(key)
+        try:
+            meta = json_backend.load(meta_path)
+            with gzip.open(body_path, "rb") as file:
+                body = file.read()
+            now = time.time()
+            os.utime(body_path, (now, now))
+        except (FileNotFoundError, json_backend.JSONDecodeError, OSError, EOFError):
+            return None
+        with self._lock:
+            self._last_access[key] = now
+        return CachedResponse(key, meta, body)
+
+    def store(self, key: str, body: bytes, headers=None) -> CachedResponse:
+        """Stores a response body, callers only store bodies they could decode."""
+        headers = headers or {}
+        meta_path, body_path = self._paths(key)
+        now = time.time()
+        meta = {
+            "etag": headers.get("ETag"),
+            "last_modified": headers.get("Last-Modified"),
+            "stored_at": now,
+        }
+        try:
+            body_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = temporary_path(str(body_path))
+            with gzip.open(tmp_path, "wb") as file:
+                file.write(body)
+            os.replace(tmp_path, body_path)
+            self._write_meta(key, meta)
+            with self._lock:
+                self._sizes[key] = body_path.stat().st_size
+                self._last_access[key] = now
+            self._evict()
+        except Exception as e:
+            logger.error(f"Could not store cached response {key}: {str(e)}")
+            logger.error(traceback.format_exc())
+        return CachedResponse(key, meta, body)
+
+    def revalidated(self, entry: CachedResponse) -> CachedResponse:
+        """Marks an entry as fresh again after the server answered 304 Not Modified."""
+        entry.meta["stored_at"] = time.time()
+        self._write_meta(entry.key, entry.meta)
+        return entry
+
+    def _paths(self, key: str):
+        directory = self.cache_dir / key[:2]
+        return directory / f"{key}.meta", directory / f"{key}.json.gz"
+
+    def _write_meta(self, key: str, meta: dict):
+        meta_path, _ = self._paths(key)
+        meta_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = temporary_path(str(meta_path))
+        with open(tmp_path, "wb") as file:
+            file.write(json_backend.dumps(meta, pretty=False))
+        os.replace(tmp_path, meta_path)
+
+    def _scan(self):
+        for path in self.cache_dir.glob("*/*.json.gz"):
+            key = path.name[:-len(".json.gz")]
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                # Evicted by another process sharing the cache directory
+                continue
+            self._sizes[key] = stat.st_size
+            self._last_access[key] = stat.st_mtime
+
+    def _evict(self):
+        with self._lock:
+            total_size = sum(self._sizes.values())
+            if total_size <= self.max_size:
+                return
+            for key in sorted(self._sizes, key=self._last_access.get):
+                if total_size <= self.max_size:
+                    break
+                for path in self._paths(key):
+                    path.unlink(missing_ok=True)
+                total_size -= self._sizes.pop(key)
+                self._last_access.pop(key, None)
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+def get_default_cache() -> Optional[HTTPResponseCache]:
+    """Returns the process-wide cache configured through the environment, see HTTPResponseCache.from_env."""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = HTTPResponseCache.from_env() or False
+    return _default_cache or None
@@ -0,0 +1,159 @@
+import csv
+import os
+import re
+import sqlite3
+import traceback
+import unicodedata
+from pathlib import Path
+from typing import Optional, Tuple
+
+from src.PolishNHSDataMongifyer.data_models.geoapify_models import DataSource, Result
+from src.PolishNHSDataMongifyer.data_models.records import ProviderRecord
+from src.PolishNHSDataMongifyer.serialization.atomic_files import temporary_path
+from src.PolishNHSDataMongifyer.logging.logger import get_logger
+logger = get_logger(__name__)
+
+# Precision of a geocoded location, stored with every geo entry
+PRECISION_ADDRESS = "address"
+PRECISION_POSTCODE = "postcode"
+PRECISION_LOCALITY = "locality"
+
+STREET_PREFIXES = ("ulica", "ul", "aleja", "aleje", "al", "plac", "pl", "osiedle", "os", "rondo", "skwer", "bulwar")
+HOUSE_NUMBER = re.compile(r"\s(\d+[a-zA-Z]?(?:\s*[/-]\s*\d+[a-zA-Z]?)*)\s*$")
+
+def normalise_text(text: Optional[str]) -> Optional[str]:
+    """Lowercases text, strips Polish diacritics and punctuation and collapses whitespace."""
+    if not text:
+        return None
+    text = text.replace("ł", "l").replace("Ł", "L")
+    text = unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode("ascii").lower()
+    text = re.sub(r"[^a-z0-9]+", " ", text).strip()
+    return text or None
+
+def normalise_post_code(post_code: Optional[str]) -> Optional[str]:
+    """Returns the post code as NN-NNN, or None when it does not contain exactly five digits."""
+    digits = re.sub(r"\D", "", post_code or "")
+    return f"{digits[:2]}-{digits[2:]}" if len(digits) == 5 else None
+
+def split_street(street: Optional[str]) -> Tuple[Optional[str], Optional[str]]:
+    """Splits e.g. "ul. Długa 5/7" into ("Długa", "5/7"), dropping street type prefixes."""
+    if not street:
+        return None, None
+    street = street.strip()
+    house_number = None
+    match = HOUSE_NUMBER.search(f" {street}")
+    if match:
+        house_number = re.sub(r"\s+", "", match.group(1))
+        street = street[:match.start()].strip()
+    words = street.split()
+    while words and words[0].rstrip(".").lower() in STREET_PREFIXES:
+        words = words[1:]
+    return " ".join(words) or None, house_number
+
+class OfflineGeocoder:
+    """Geocodes providers from a local gazetteer of post code and locality centroids.
+
+    The gazetteer is a user-supplied CSV with post_code, locality, lat and lon columns, converted once by build()
+    into an indexed SQLite file. Lookups try the post code together with the locality, then the post code alone and
+    finally the locality alone, and report which of these matched as the precision of the result.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.connection = sqlite3.connect(db_path, check_same_thread=False)
+
+    @classmethod
+    def from_env(cls) -> Optional["OfflineGeocoder"]:
+        """Opens the gazetteer pointed to by GAZETTEER_PATH, building it first when a CSV file is given."""
+        path = os.getenv("GAZETTEER_PATH")
+        if not path:
+            return None
+        if path.endswith(".csv"):
+            db_path = str(Path(path).with_suffix(".sqlite"))
+            if not os.path.exists(db_path) or os.path.getmtime(db_path) < os.path.getmtime(path):
+                cls.build(path, db_path)
+            path = db_path
+        return cls(path)
+
+    @staticmethod
+    def build(csv_path, db_path):
+        # Every process builds into its own file, concurrent builds replace db_path with complete databases only
+        tmp_path = temporary_path(db_path)
+        connection = sqlite3.connect(tmp_path)
+        try:
+            connection.execute("CREATE TABLE points (post_code TEXT, locality TEXT, lon REAL, lat REAL)")
+            with open(csv_path, newline="", encoding="utf-8") as csv_file:
+                rows = (
+                    (normalise_post_code(row["post_code"]), normalise_text(row["locality"]),
+                     float(row["lon"]), float(row["lat"]))
+                    for row in csv.DictReader(csv_file)
+                )
+                connection.executemany("INSERT INTO points VALUES (?, ?, ?, ?)", rows)
+
+            # Centroids are precomputed per lookup level, so a lookup is a single indexed read
+            connection.executescript("""
+                CREATE TABLE by_post_code_locality (post_code TEXT, locality TEXT, lon REAL, lat REAL,
+                                                    PRIMARY KEY (post_code, locality)) WITHOUT ROWID;
+                INSERT INTO by_post_code_locality SELECT post_code, locality, AVG(lon), AVG(lat) FROM points
+                    WHERE post_code IS NOT NULL AND locality IS NOT NULL GROUP BY post_code, locality;
+                CREATE TABLE by_post_code (post_code TEXT PRIMARY KEY, lon REAL, lat REAL) WITHOUT ROWID;
+                INSERT INTO by_post_code SELECT post_code, AVG(lon), AVG(lat) FROM points
+                    WHERE post_code IS NOT NULL GROUP BY post_code;
+                CREATE TABLE by_locality (locality TEXT PRIMARY KEY, lon REAL, lat REAL) WITHOUT ROWID;
+                INSERT INTO by_locality SELECT locality, AVG(lon), AVG(lat) FROM points
+                    WHERE locality IS NOT NULL GROUP BY locality;
+                DROP TABLE points;
+            """)
+            connection.commit()
+            connection.execute("VACUUM")
+            connection.close()
+            os.replace(tmp_path, db_path)
+        except BaseException:
+            connection.close()
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        logger.info(f"Built gazetteer {db_path} from {csv_path}")
+
+    def lookup(self, place: Optional[str], post_code: Optional[str]) -> Optional[Tuple[float, float, str]]:
+        """Returns (lon, lat, precision) of the best matching centroid, or None."""
+        locality = normalise_text(place)
+        post_code = normalise_post_code(post_code)
+        queries = (
+            ("SELECT lon, lat FROM by_post_code_locality WHERE post_code = ? AND locality = ?",
+             (post_code, locality), PRECISION_POSTCODE),
+            ("SELECT lon, lat FROM by_post_code WHERE post_code = ?", (post_code,), PRECISION_POSTCODE),
+            ("SELECT lon, lat FROM by_locality WHERE locality = ?", (locality,), PRECISION_LOCALITY),
+        )
+        for query, params, precision in queries:
+            if None in params:
+                continue
+            row = self.connection.execute(query, params).fetchone()
+            if row:
+                return row[0], row[1], precision
+        return None
+
+    def geocode(self, provider: ProviderRecord) -> Optional[Tuple[Result, str]]:
+        try:
+            found = self.lookup(provider.place, provider.post_code)
+        except sqlite3.Error as e:
+            logger.error(f"Gazetteer lookup failed for provider {provider.code}: {str(e)}")
+            logger.error(traceback.format_exc())
+            return None
+        if not found:
+            return None
+        lon, lat, precision = found
+        street, house_number = split_street(provider.street)
+        result = Result(
+            datasource=DataSource(sourcename="gazetteer", attribution="local gazetteer", license="unknown"),
+            city=provider.place or "",
+            postcode=normalise_post_code(provider.post_code) or provider.post_code or "",
+            street=street or "",
+            housenumber=house_number or "",
+            lon=lon,
+            lat=lat,
+            country="Polska",
+            country_code="pl",
+            result_type=precision,
+        )
+        return result, precision
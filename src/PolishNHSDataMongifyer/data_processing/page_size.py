@@ -0,0 +1,102 @@
+import threading
+from typing import Dict, Optional
+
+from src.PolishNHSDataMongifyer.logging.logger import get_logger
+logger = get_logger(__name__)
+
+# Every size divides the next one, so an offset reached with any size is a page boundary for all smaller sizes
+PAGE_SIZES = (5, 25, 50, 100, 200, 400, 800)
+
+class AdaptivePageSize:
+    """Chooses the agreements page size from the largest limit the API accepts and the observed latency.
+
+    The first request probes the largest size; sizes rejected by the API lower the accepted maximum, which is shared
+    by all instances so later years and branches do not probe again. Afterwards the size steps down after a failed
+    or slow request and steps up after grow_after consecutive fast ones. Pages are addressed by page number, so
+    a larger size is only used once the current offset is a multiple of it.
+
+    recorded_limits maps offsets to the sizes saved pages were fetched with. They are requested again with the same
+    size, so that re-runs send the same requests as before and are answered from the HTTP cache, until a request
+    fails and the size adapts again.
+    """
+
+    _accepted_maximum: Optional[int] = None
+    _lock = threading.Lock()
+
+    def __init__(self, fixed_limit: Optional[int] = None, target_latency: float = 2.0, grow_after: int = 3,
+                 recorded_limits: Optional[Dict[int, int]] = None):
+        self.fixed_limit = fixed_limit
+        self.recorded_limits = recorded_limits or {}
+        self.target_latency = target_latency
+        self.grow_after = grow_after
+        self.fast_requests = 0
+        self.index = self.maximum_index
+
+    @property
+    def maximum_index(self) -> int:
+        return PAGE_SIZES.index(AdaptivePageSize._accepted_maximum or PAGE_SIZES[-1])
+
+    def limit_for(self, offset: int) -> int:
+        if self.fixed_limit:
+            return self.fixed_limit
+        self.index = min(self.index, self.maximum_index)
+        recorded = self.recorded_limits.get(offset)
+        if recorded and recorded <= PAGE_SIZES[self.maximum_index]:
+            return recorded
+        index = self.index
+        while index > 0 and offset % PAGE_SIZES[index]:
+            index -= 1
+        return PAGE_SIZES[index]
+
+    def record_success(self, latency: float):
+        if self.fixed_limit:
+            return
+        if latency > self.target_latency:
+            self.fast_requests = 0
+            self._step_down(f"latency {latency:.2f}s")
+            return
+        if latency < self.target_latency / 2:
+            self.fast_requests += 1
+            if self.fast_requests >= self.grow_after and self.index < self.maximum_index:
+                self.fast_requests = 0
+                self.index += 1
+                logger.info(f"Increasing agreements page size to {PAGE_SIZES[self.index]}")
+
+    def record_failure(self, limit: int, error: Exception):
+        if self.fixed_limit:
+            return
+        self.fast_requests = 0
+        self.recorded_limits = {}
+        if self.is_limit_rejected(error):
+            with AdaptivePageSize._lock:
+                smaller = [size for size in PAGE_SIZES if size < limit]
+                if smaller and (AdaptivePageSize._accepted_maximum or PAGE_SIZES[-1]) >= limit:
+                    AdaptivePageSize._accepted_maximum = smaller[-1]
+                    logger.info(f"Page size {limit} was rejected, using at most {smaller[-1]}")
+        self._step_down(str(error))
+
+    def record_clamped(self, limit: int, returned_limit: int) -> bool:
+        """Lowers the maximum when the API silently used a smaller page size than requested.
+
+        Returns whether the page has to be requested again with a smaller size.
+        """
+        accepted = [size for size in PAGE_SIZES if size <= returned_limit] or [PAGE_SIZES[0]]
+        if accepted[-1] >= limit:
+            return False
+        self.recorded_limits = {}
+        with AdaptivePageSize._lock:
+            AdaptivePageSize._accepted_maximum = accepted[-1]
+        logger.info(f"Page size {limit} was limited by the API to {returned_limit}, using at most {accepted[-1]}")
+        return True
+
+    def _step_down(self, reason: str):
+        if self.index > 0:
+            self.index -= 1
+            logger.info(f"Decreasing agreements page size to {PAGE_SIZES[self.index]} ({reason})")
+
+    @staticmethod
+    def is_limit_rejected(error: Exception) -> bool:
+        import requests
+        response = getattr(error, "response", None)
+        return isinstance(error, requests.exceptions.HTTPError) and response is not None \
+            and response.status_code in (400, 413, 422)
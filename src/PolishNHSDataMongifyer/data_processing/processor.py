@@ -1,59 +1,124 @@
-import json
 import os
 import time
 import traceback
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Tuple
 
 from pydantic import ValidationError
 from src.PolishNHSDataMongifyer.data_processing.file_manager import FileDataManagement
 from src.PolishNHSDataMongifyer.data_models.geoapify_models import Response, Result
 from src.PolishNHSDataMongifyer.data_models.nhs_api_models import Agreement, AgreementsPage, Branch, Provider, ProvidersPage, ServiceType
+from src.PolishNHSDataMongifyer.data_models.records import ProviderRecord, decode_agreements, decode_providers
+from src.PolishNHSDataMongifyer.serialization import json_backend
 from src.PolishNHSDataMongifyer.validation.validation import Validation
-from .api_client import APIClient, NFZAPI_BASE_URL, GEOAPIFY_BASE_URL
+from .page_size import AdaptivePageSize, PAGE_SIZES
+from .offline_geocoder import OfflineGeocoder, PRECISION_ADDRESS
+from .api_client import APIClient, NFZAPI_BASE_URL, NFZAPI_RATE_LIMITER, GEOAPIFY_BASE_URL
 from src.PolishNHSDataMongifyer.logging.logger import get_logger
 logger = get_logger(__name__)
 
+# "online" uses Geoapify only, "fallback" uses the gazetteer when Geoapify fails, "offline" uses the gazetteer only
+GEOCODING_MODES = ("online", "fallback", "offline")
+# Fetched providers and their locations are written in batches of this size, each write rewrites the whole file
+SAVE_BATCH_SIZE = 100
 
 class HealthcareDataProcessing:
 
-    def __init__(self, branch: Branch, service: ServiceType, file_manager: FileDataManagement ):
+    def __init__(self, branch: Branch, service: ServiceType, file_manager: FileDataManagement,
+                 strict_validation: bool = False, geocoding_mode: str = None, offline_geocoder: OfflineGeocoder = None):
         self.branch = branch
         self.service = service
         self.file_manager = file_manager
+        self.strict_validation = strict_validation
+        self.geocoding_mode = geocoding_mode or os.getenv("GEOCODING_MODE", "online")
+        if self.geocoding_mode not in GEOCODING_MODES:
+            raise ValueError(f"Unknown geocoding mode '{self.geocoding_mode}', expected one of: "
+                             f"{', '.join(GEOCODING_MODES)}")
+        self.offline_geocoder = offline_geocoder
+        if self.offline_geocoder is None and self.geocoding_mode != "online":
+            self.offline_geocoder = OfflineGeocoder.from_env()
+            if self.offline_geocoder is None:
+                logger.error(f"Geocoding mode '{self.geocoding_mode}' requires GAZETTEER_PATH to be set")
         self.file_manager.setup_file_structure()
 
     def has_next_page(agreements_page: AgreementsPage|ProvidersPage):
        return agreements_page.links is not None and agreements_page.links.next_page is not None
 
-    def process_agreements(self, year=2025, limit=25, startPage=1):
+    def process_agreements(self, year=None, limit=None, start_offset=0, resume=False, max_retries=5) -> bool:
+        """Fetches agreement pages, with an adaptive page size unless a fixed limit is given.
+
+        With resume set, fetching continues after the last saved page instead of start_offset. Returns False when
+        fetching gave up after max_retries consecutive failures, the saved pages are incomplete then.
+        """
+        year = year or self.file_manager.YEAR
+        # Sizes of the saved pages are reused, re-runs then request the same pages and hit the HTTP cache
+        page_size = AdaptivePageSize(fixed_limit=limit,
+                                     recorded_limits=None if limit else self.file_manager.get_agreement_page_sizes())
+        offset = start_offset
+        if resume:
+            # Page numbers are derived from offsets, so the offset has to be a multiple of every size in use
+            offset = self.file_manager.get_agreements_resume_offset(alignment=limit or PAGE_SIZES[0])
         params = {
             "year": year,
             "branch": self.branch.value,
             "serviceType":self.service.value,
-            "page": startPage,
-            "limit": limit,
             "format": "json",
             "api-version": 1.2
         }
+        first_offset = offset
+        saved_pages = []
+        failures = 0
         next_page = True
 
         while (next_page):
+            page_limit = page_size.limit_for(offset)
+            params["page"] = offset // page_limit + 1
+            params["limit"] = page_limit
             try:
-                time.sleep(0.11)
-                response_data = APIClient(NFZAPI_BASE_URL).fetch(endpoint='agreements', params=params)  
-                parsed_response = Validation.validate(response_data, AgreementsPage)
-                next_page = HealthcareDataProcessing.has_next_page(parsed_response)
-                agreements = parsed_response.data.agreements
-                page_number = parsed_response.meta.page
-                
-                serialized_agreements = [agreement.model_dump(by_alias=True) for agreement in agreements]
-                self.file_manager.save_agreements_page(page_data=serialized_agreements, page_number=page_number,
-                                            request_page_limit=limit)
-                params["page"] += 1  
+                started = time.monotonic()
+                response_data = APIClient(NFZAPI_BASE_URL, NFZAPI_RATE_LIMITER).fetch(endpoint='agreements', params=params)  
+                latency = time.monotonic() - started
+                returned_limit = response_data["meta"].get("limit")
+                if not limit and returned_limit and page_size.record_clamped(page_limit, returned_limit):
+                    continue
+                if self.strict_validation:
+                    parsed_response = Validation.validate(response_data, AgreementsPage)
+                    next_page = HealthcareDataProcessing.has_next_page(parsed_response)
+                    agreements = parsed_response.data.agreements
+                    serialized_agreements = [agreement.model_dump(mode="json", by_alias=True) for agreement in agreements]
+                else:
+                    next_page = (response_data.get("links") or {}).get("next") is not None
+                    serialized_agreements = [agreement.to_api() for agreement in
+                                             decode_agreements(response_data["data"]["agreements"])]
+
+                saved_pages.append(self.file_manager.save_agreements_page(page_data=serialized_agreements,
+                                                                          offset=offset))
+                page_size.record_success(latency)
+                failures = 0
+                offset += page_limit
             except Exception as e:
-                logger.error(f"Unexpected error occurred while processing agreements: {str(e)}")
-                logger.error(traceback.format_exc())
+                if not limit and AdaptivePageSize.is_limit_rejected(e):
+                    # Rejected sizes are expected while probing for the largest size the API accepts
+                    logger.info(f"Agreements page size {page_limit} was rejected: {str(e)}")
+                else:
+                    logger.error(f"Unexpected error occurred while processing agreements: {str(e)}")
+                    logger.error(traceback.format_exc())
+                page_size.record_failure(page_limit, e)
+                failures += 1
+                if failures > max_retries:
+                    logger.error(f"Giving up fetching agreements of {year} at offset {offset} after {failures} failures")
+                    # Keeps the saved pages free of duplicates, so that a resumed fetch can continue them
+                    self.file_manager.remove_overlapping_agreement_pages(keep=saved_pages, start=first_offset, end=offset)
+                    return False
 
-    def get_provider_info(self, provider_code: str) -> Provider:
+        # Every page of a full fetch was just written, anything else in the directory is left over from earlier runs
+        if not resume and start_offset == 0:
+            self.file_manager.remove_stale_agreement_pages(keep=saved_pages)
+        else:
+            self.file_manager.remove_overlapping_agreement_pages(keep=saved_pages, start=first_offset, end=offset)
+        return True
+
+    def get_provider_info(self, provider_code: str) -> ProviderRecord:
         params = {
             "code": provider_code,
             "branch": str(self.branch.value),
@@ -63,41 +128,59 @@ class HealthcareDataProcessing:
         }
         
         try:
-            response_data = APIClient(NFZAPI_BASE_URL).fetch(endpoint='providers', params=params)  
-            parsed_response = ProvidersPage(**response_data)
-            providers = parsed_response.data.entries
-            return providers[0]
+            response_data = APIClient(NFZAPI_BASE_URL, NFZAPI_RATE_LIMITER).fetch(endpoint='providers', params=params)  
+            if self.strict_validation:
+                Validation.validate(response_data, ProvidersPage)
+            return ProviderRecord.from_api(response_data["data"]["entries"][0])
         except Exception as e:
             logger.error(f"Unexpected error occurred: {str(e)}")
             logger.error(traceback.format_exc())
 
-    def process_output_providers(self):
-        agreements_path = self.file_manager.AGREEMENTS_DATA_DIR
-        processed_providers = []
+    def get_agreements_provider_codes(self) -> List[str]:
+        provider_codes = []
+        for page_path in self.file_manager.list_agreement_pages():
+            data = json_backend.load(page_path)
+            if self.strict_validation:
+                Validation.validate_list(data, Agreement)
+            for agreement in decode_agreements(data):
+                if agreement.provider_code not in provider_codes:
+                    provider_codes.append(agreement.provider_code)
+        return provider_codes
+
+    def process_output_providers(self, max_workers: int = 1) -> bool:
+        """Fetches and saves providers of the saved agreements, returns False when some of them could not be fetched."""
         try:
-            for page_file in os.listdir(agreements_path):
-                page_path = os.path.join(agreements_path, page_file)
-                with open(page_path, 'r') as json_file:
-                    data = json.load(json_file)
-                    agreements = Validation.validate_list(data, Agreement)
-                    for agreement in agreements:
-                        if agreement.attributes.provider_code not in processed_providers:
-                            time.sleep(0.11)
-                            provider_data = self.get_provider_info(agreement.attributes.provider_code)
-                            if(provider_data):
-                                self.file_manager.save_provider(provider_data)
-                                processed_providers.append(provider_data.attributes.code)
+            # Providers saved while processing other years of the same branch are reused
+            saved_providers = set(self.file_manager.get_saved_provider_codes())
+            missing_providers = [code for code in self.get_agreements_provider_codes() if code not in saved_providers]
+
+            # Requests are spaced out by the shared rate limiter, results are saved in order from this thread only
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                missing_count = 0
+                fetched = []
+                for provider_data in executor.map(self.get_provider_info, missing_providers):
+                    if(provider_data):
+                        fetched.append(provider_data)
+                    else:
+                        missing_count += 1
+                    if len(fetched) >= SAVE_BATCH_SIZE:
+                        self.file_manager.save_providers(fetched)
+                        fetched = []
+                self.file_manager.save_providers(fetched)
+            if missing_count:
+                logger.error(f"Could not fetch {missing_count} of {len(missing_providers)} providers")
+            return missing_count == 0
         except Exception as e:
             logger.error(f"Unexpected error occurred while processing providers: {str(e)}")
             logger.error(traceback.format_exc())
+            return False
 
-    def get_provider_geographical_data(provider: Provider) -> Result:
-        attr = provider.attributes
+    def get_provider_geographical_data(provider: ProviderRecord) -> Result:
         apiKey = os.getenv("GEOAPIFY_KEY")
         params = {
-            "city": attr.place,
-            "street": attr.street,
-            "postcode": attr.post_code,
+            "city": provider.place,
+            "street": provider.street,
+            "postcode": provider.post_code,
             "country": "Poland",
             "lang": "pl",
             "limit": 1,
@@ -116,24 +199,60 @@ class HealthcareDataProcessing:
             logger.error(traceback.format_exc())
             raise
 
-    def process_provider_geographical_data(self):
+    def geocode_provider(self, provider: ProviderRecord) -> Tuple[Result, str]:
+        if self.geocoding_mode == "offline":
+            return self.geocode_provider_offline(provider)
+        try:
+            geo_data = HealthcareDataProcessing.get_provider_geographical_data(provider)
+            return Validation.validate(geo_data, Result), PRECISION_ADDRESS
+        except Exception:
+            if self.geocoding_mode != "fallback":
+                raise
+            logger.info(f"Falling back to the gazetteer for provider {provider.code}")
+            return self.geocode_provider_offline(provider)
+
+    def geocode_provider_offline(self, provider: ProviderRecord) -> Tuple[Result, str]:
+        found = self.offline_geocoder.geocode(provider) if self.offline_geocoder else None
+        if not found:
+            raise ValueError(f"Could not find provider {provider.code} in the gazetteer")
+        return found
+
+    def process_provider_geographical_data(self) -> bool:
+        """Geocodes saved providers, returns False when the providers could not be processed at all.
+
+        Providers that cannot be located are only logged, they are looked up again by the next run.
+        """
         input_file = self.file_manager.PROVIDERS_DATA
-        with open(input_file, "r") as file:
-            try:
-                data = json.load(file)
-                providers = Validation.validate_list(data, Provider)
-                for provider in providers:
-                    try:
-                        geo_data = HealthcareDataProcessing.get_provider_geographical_data(provider)
-                        geo_result = Validation.validate(geo_data, Result)
-                        self.file_manager.save_provider_geo_data(provider, geo_result)
-                    except Exception as e:
-                        logger.error(f"Error while processing geographical data of providers: {str(e)}")
-                        logger.error(traceback.format_exc())
-
-            except ValidationError as e:
-                logger.error(f"Cannot validate providers in {input_file}: {str(e)}")
-                logger.error(traceback.format_exc())
-            except Exception as e:
-                logger.error(f"Unexpected error occurred while processing geographical data of providers: {str(e)}")
-                logger.error(traceback.format_exc())
\ No newline at end of file
+        try:
+            # Configurations without agreements leave the providers file empty, there is nothing to geocode then
+            data = self.file_manager._load_list(input_file)
+            if self.strict_validation:
+                Validation.validate_list(data, Provider)
+            providers = decode_providers(data)
+            # Low precision locations from the offline pre-pass are looked up again when Geoapify can be used
+            upgrade_precision = self.geocoding_mode != "offline"
+            geocoded_providers = set(self.file_manager.get_geocoded_provider_codes(
+                precision=PRECISION_ADDRESS if upgrade_precision else None))
+            geocoded = []
+            for provider in providers:
+                if provider.code in geocoded_providers:
+                    continue
+                try:
+                    geo_result, precision = self.geocode_provider(provider)
+                    geocoded.append((provider, geo_result, precision))
+                except Exception as e:
+                    logger.error(f"Error while processing geographical data of providers: {str(e)}")
+                    logger.error(traceback.format_exc())
+                if len(geocoded) >= SAVE_BATCH_SIZE:
+                    self.file_manager.save_providers_geo_data(geocoded, strict_validation=self.strict_validation)
+                    geocoded = []
+            self.file_manager.save_providers_geo_data(geocoded, strict_validation=self.strict_validation)
+            return True
+
+        except ValidationError as e:
+            logger.error(f"Cannot validate providers in {input_file}: {str(e)}")
+            logger.error(traceback.format_exc())
+        except Exception as e:
+            logger.error(f"Unexpected error occurred while processing geographical data of providers: {str(e)}")
+            logger.error(traceback.format_exc())
+        return False
\ No newline at end of file
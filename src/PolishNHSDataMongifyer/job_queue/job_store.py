@@ -0,0 +1,199 @@
+import sqlite3
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional
+
+from src.PolishNHSDataMongifyer.data_models.custom_models import DBSetupConfig
+from src.PolishNHSDataMongifyer.logging.logger import get_logger
+logger = get_logger(__name__)
+
+STATUS_PENDING = "pending"
+STATUS_RUNNING = "running"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+
+SCHEMA = ("""
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    branch TEXT NOT NULL,
+    service_type TEXT NOT NULL,
+    year INTEGER NOT NULL,
+    config TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    worker TEXT,
+    lease_expires REAL,
+    enqueued_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    fetch_seconds REAL,
+    setup_seconds REAL,
+    error TEXT,
+    UNIQUE (branch, service_type, year)
+)
+""", """
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, lease_expires)
+""")
+
+@dataclass(slots=True)
+class Job:
+    id: int
+    branch: str
+    service_type: str
+    year: int
+    config: str
+    status: str
+    attempts: int
+    max_attempts: int
+    worker: Optional[str]
+    lease_expires: Optional[float]
+    enqueued_at: float
+    started_at: Optional[float]
+    finished_at: Optional[float]
+    fetch_seconds: Optional[float]
+    setup_seconds: Optional[float]
+    error: Optional[str]
+
+    def to_config(self) -> DBSetupConfig:
+        return DBSetupConfig.model_validate_json(self.config)
+
+class JobStore:
+    """Queue of (branch, service_type, year) jobs kept in a SQLite file that every worker can open.
+
+    Workers lease a job for lease_seconds and keep extending the lease with heartbeats while they run it. A job whose
+    lease expired, because its worker crashed or lost access to the store, is leased again by the next worker until
+    it used up max_attempts. Jobs of the same branch and service type share their providers files, so they are never
+    leased to two workers at once.
+
+    Every operation opens a short-lived connection and takes the write lock up front with BEGIN IMMEDIATE, which
+    keeps the store usable on shared storage where SQLite's WAL mode is not available.
+    """
+
+    def __init__(self, db_path: str, timeout: float = 60.0):
+        self.db_path = db_path
+        self.timeout = timeout
+        with self._transaction() as connection:
+            for statement in SCHEMA:
+                connection.execute(statement)
+
+    @contextmanager
+    def _transaction(self):
+        connection = sqlite3.connect(self.db_path, timeout=self.timeout, isolation_level=None)
+        connection.row_factory = sqlite3.Row
+        try:
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                yield connection
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+            connection.execute("COMMIT")
+        finally:
+            connection.close()
+
+    def enqueue(self, configs: Iterable[DBSetupConfig], max_attempts: int = 3) -> int:
+        """Adds a job for every year of every configuration, returns the number of jobs added or reset.
+
+        Jobs that already finished or failed are reset to pending, jobs waiting or running are left as they are.
+        """
+        now = time.time()
+        rows = [
+            (config.branch.value, config.service_type.value, year,
+             config.model_copy(update={"year": year, "year_to": None}).model_dump_json(), STATUS_PENDING,
+             max_attempts, now)
+            for config in configs for year in config.years
+        ]
+        with self._transaction() as connection:
+            changes = connection.total_changes
+            connection.executemany("""
+                INSERT INTO jobs (branch, service_type, year, config, status, max_attempts, enqueued_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (branch, service_type, year) DO UPDATE SET
+                    config = excluded.config, status = excluded.status, attempts = 0,
+                    max_attempts = excluded.max_attempts, worker = NULL, lease_expires = NULL,
+                    enqueued_at = excluded.enqueued_at, started_at = NULL, finished_at = NULL,
+                    fetch_seconds = NULL, setup_seconds = NULL, error = NULL
+                WHERE jobs.status IN ('done', 'failed')
+            """, rows)
+            return connection.total_changes - changes
+
+    def lease(self, worker: str, lease_seconds: float) -> Optional[Job]:
+        """Leases the oldest pending job, or a running one whose lease expired, to the worker."""
+        now = time.time()
+        with self._transaction() as connection:
+            expired = connection.execute("""
+                UPDATE jobs SET status = 'failed', error = 'Lease expired after the last attempt', finished_at = ?
+                WHERE status = 'running' AND lease_expires < ? AND attempts >= max_attempts
+                RETURNING id, worker
+            """, (now, now)).fetchall()
+            for row in expired:
+                logger.error(f"Job {row['id']} failed, its lease held by {row['worker']} expired after the last attempt")
+
+            row = connection.execute("""
+                SELECT * FROM jobs AS job
+                WHERE (job.status = 'pending' OR (job.status = 'running' AND job.lease_expires < :now))
+                  AND NOT EXISTS (
+                      SELECT 1 FROM jobs AS other
+                      WHERE other.branch = job.branch AND other.service_type = job.service_type
+                        AND other.id != job.id AND other.status = 'running' AND other.lease_expires >= :now)
+                ORDER BY job.id
+                LIMIT 1
+            """, {"now": now}).fetchone()
+            if row is None:
+                return None
+            if row["status"] == STATUS_RUNNING:
+                logger.warning(f"Lease of job {row['id']} held by {row['worker']} expired, leasing it again")
+
+            row = connection.execute("""
+                UPDATE jobs SET status = 'running', worker = ?, lease_expires = ?, attempts = attempts + 1,
+                                started_at = ?, error = NULL
+                WHERE id = ?
+                RETURNING *
+            """, (worker, now + lease_seconds, now, row["id"])).fetchone()
+            return Job(**dict(row))
+
+    def heartbeat(self, job_id: int, worker: str, lease_seconds: float) -> bool:
+        """Extends the lease, returns False when the job is no longer leased to the worker."""
+        with self._transaction() as connection:
+            cursor = connection.execute(
+                "UPDATE jobs SET lease_expires = ? WHERE id = ? AND worker = ? AND status = 'running'",
+                (time.time() + lease_seconds, job_id, worker))
+            return cursor.rowcount == 1
+
+    def complete(self, job_id: int, worker: str, fetch_seconds: float, setup_seconds: float) -> bool:
+        with self._transaction() as connection:
+            cursor = connection.execute("""
+                UPDATE jobs SET status = 'done', lease_expires = NULL, finished_at = ?, fetch_seconds = ?,
+                                setup_seconds = ?
+                WHERE id = ? AND worker = ? AND status = 'running'
+            """, (time.time(), fetch_seconds, setup_seconds, job_id, worker))
+            return cursor.rowcount == 1
+
+    def fail(self, job_id: int, worker: str, error: str) -> bool:
+        """Records a failed attempt, the job goes back to pending unless it used up its attempts."""
+        with self._transaction() as connection:
+            cursor = connection.execute("""
+                UPDATE jobs SET status = CASE WHEN attempts >= max_attempts THEN 'failed' ELSE 'pending' END,
+                                lease_expires = NULL, finished_at = ?, error = ?
+                WHERE id = ? AND worker = ? AND status = 'running'
+            """, (time.time(), error, job_id, worker))
+            return cursor.rowcount == 1
+
+    def jobs(self, status: Optional[str] = None) -> List[Job]:
+        with self._transaction() as connection:
+            if status:
+                rows = connection.execute("SELECT * FROM jobs WHERE status = ? ORDER BY id", (status,)).fetchall()
+            else:
+                rows = connection.execute("SELECT * FROM jobs ORDER BY id").fetchall()
+        return [Job(**dict(row)) for row in rows]
+
+    def counts(self) -> Dict[str, int]:
+        with self._transaction() as connection:
+            rows = connection.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {status: count for status, count in rows}
+
+    def has_unfinished_jobs(self) -> bool:
+        counts = self.counts()
+        return bool(counts.get(STATUS_PENDING) or counts.get(STATUS_RUNNING))
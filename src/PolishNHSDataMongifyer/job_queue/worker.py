@@ -0,0 +1,178 @@
+import argparse
+import os
+import socket
+import threading
+import time
+import traceback
+from typing import Optional
+
+from src.PolishNHSDataMongifyer.data_models.custom_models import DBSetupConfig
+from src.PolishNHSDataMongifyer.data_models.nhs_api_models import Branch
+from src.PolishNHSDataMongifyer.job_queue.job_store import Job, JobStore
+from src.PolishNHSDataMongifyer.logging.logger import get_logger
+logger = get_logger(__name__)
+
+class Heartbeat:
+    """Keeps extending the lease of a job from a background thread while the job runs."""
+
+    def __init__(self, store: JobStore, job: Job, worker: str, lease_seconds: float):
+        self.store = store
+        self.job = job
+        self.worker = worker
+        self.lease_seconds = lease_seconds
+        self.lost = False
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def __enter__(self) -> "Heartbeat":
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._stopped.set()
+        self._thread.join()
+        return False
+
+    def _run(self):
+        while not self._stopped.wait(self.lease_seconds / 3):
+            try:
+                if not self.store.heartbeat(self.job.id, self.worker, self.lease_seconds):
+                    self.lost = True
+                    logger.warning(f"Worker {self.worker} lost the lease of job {self.job.id}")
+                    return
+            except Exception as e:
+                # The lease is still valid for a while, the next heartbeat may get through
+                logger.error(f"Heartbeat of job {self.job.id} failed: {str(e)}")
+
+class QueueWorker:
+    """Leases jobs from a JobStore and runs the DatabaseSetup pipeline for each of them.
+
+    Output goes to HealthCareData inside output_dir, which has to be shared by the workers that run jobs of the same
+    branch and service type. Fetching and collection setup are timed separately and stored with the job.
+    """
+
+    def __init__(self, store: JobStore, output_dir: str, worker: Optional[str] = None, lease_seconds: float = 300,
+                 poll_interval: float = 10):
+        self.store = store
+        self.output_dir = output_dir
+        self.worker = worker or f"{socket.gethostname()}:{os.getpid()}"
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+
+    def run(self, max_jobs: Optional[int] = None, wait: bool = False) -> int:
+        """Runs jobs until none is left, returns the number of jobs run.
+
+        With wait set the worker keeps polling while other workers still hold jobs, so it can take over the jobs of
+        workers that crash.
+        """
+        jobs_run = 0
+        while max_jobs is None or jobs_run < max_jobs:
+            job = self.store.lease(self.worker, self.lease_seconds)
+            if job is None:
+                if wait and self.store.has_unfinished_jobs():
+                    time.sleep(self.poll_interval)
+                    continue
+                break
+            self.run_job(job)
+            jobs_run += 1
+        logger.info(f"Worker {self.worker} finished after {jobs_run} jobs")
+        return jobs_run
+
+    def run_job(self, job: Job):
+        logger.info(f"Worker {self.worker} running job {job.id}: branch {job.branch}, service type "
+                    f"{job.service_type}, year {job.year}, attempt {job.attempts}/{job.max_attempts}")
+        with Heartbeat(self.store, job, self.worker, self.lease_seconds) as heartbeat:
+            try:
+                fetch_seconds, setup_seconds = self.run_pipeline(job.to_config())
+            except Exception as e:
+                logger.error(f"Job {job.id} failed: {str(e)}")
+                logger.error(traceback.format_exc())
+                if not self.store.fail(job.id, self.worker, f"{type(e).__name__}: {str(e)}"):
+                    logger.warning(f"Job {job.id} was leased again in the meantime, its failure is not recorded")
+                return
+
+        if heartbeat.lost or not self.store.complete(job.id, self.worker, fetch_seconds, setup_seconds):
+            logger.warning(f"Job {job.id} was leased again in the meantime, its result is not recorded")
+            return
+        logger.info(f"Job {job.id} done, fetching took {fetch_seconds:.1f}s and collection setup {setup_seconds:.1f}s")
+
+    def run_pipeline(self, config: DBSetupConfig):
+        """Runs every stage for the configuration, raising when one of them failed so the job is retried."""
+        from src.PolishNHSDataMongifyer.collection_setup.db_setup import DatabaseSetup
+        from src.PolishNHSDataMongifyer.data_processing.file_manager import FileDataManagement
+        from src.PolishNHSDataMongifyer.data_processing.processor import HealthcareDataProcessing
+
+        # FileDataManagement places HealthCareData next to the given path
+        file_manager = FileDataManagement(config.branch, config.service_type,
+                                          os.path.join(self.output_dir, "main.py"), config.year)
+        processor = HealthcareDataProcessing(config.branch, config.service_type, file_manager,
+                                             strict_validation=config.strict_validation)
+
+        started = time.monotonic()
+        if not processor.process_agreements(year=config.year, limit=config.page_size, resume=config.resume):
+            raise RuntimeError("Fetching agreements gave up, the saved pages are incomplete")
+        if not processor.process_output_providers():
+            raise RuntimeError("Some providers could not be fetched")
+        if not processor.process_provider_geographical_data():
+            raise RuntimeError("Geographical data of providers could not be processed")
+        fetched = time.monotonic()
+        if not DatabaseSetup(config, processor, fetch_data=False).collections_built:
+            raise RuntimeError("Some collections could not be built")
+        return fetched - started, time.monotonic() - fetched
+
+def print_status(store: JobStore):
+    counts = store.counts()
+    print(", ".join(f"{status}: {count}" for status, count in sorted(counts.items())) or "No jobs")
+    print(f"{'id':>5} {'branch':<7}{'service':<9}{'year':<6}{'status':<9}{'tries':<7}{'fetch s':>9}{'setup s':>9}  worker")
+    for job in store.jobs():
+        fetch = f"{job.fetch_seconds:.1f}" if job.fetch_seconds is not None else "-"
+        setup = f"{job.setup_seconds:.1f}" if job.setup_seconds is not None else "-"
+        print(f"{job.id:>5} {job.branch:<7}{job.service_type:<9}{job.year:<6}{job.status:<9}"
+              f"{f'{job.attempts}/{job.max_attempts}':<7}{fetch:>9}{setup:>9}  {job.worker or '-'}")
+        if job.error:
+            print(f"{'':>6}{job.error}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Distribute branch/service/year jobs across worker processes")
+    parser.add_argument("queue", help="SQLite file of the job queue, on storage shared by all workers")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    enqueue = commands.add_parser("enqueue", help="Add jobs to the queue")
+    enqueue.add_argument("--branch", action="append", required=True,
+                         help="Branch code, can be repeated, 'all' adds every branch")
+    enqueue.add_argument("--service-type", action="append", required=True, help="Service type code, can be repeated")
+    enqueue.add_argument("--year", type=int, default=2025)
+    enqueue.add_argument("--year-to", type=int, default=None)
+    enqueue.add_argument("--strict-validation", action="store_true")
+    enqueue.add_argument("--collection-workers", type=int, default=1)
+    enqueue.add_argument("--columnar-export", action="store_true")
+    enqueue.add_argument("--page-size", type=int, default=None)
+    enqueue.add_argument("--resume", action="store_true", help="Continue fetching after the last saved agreements page")
+    enqueue.add_argument("--max-attempts", type=int, default=3)
+
+    work = commands.add_parser("work", help="Run jobs from the queue")
+    work.add_argument("--output-dir", default=os.getcwd(), help="Directory HealthCareData is written to")
+    work.add_argument("--worker", default=None, help="Worker name, defaults to host:pid")
+    work.add_argument("--lease", type=float, default=300, help="Lease duration in seconds")
+    work.add_argument("--max-jobs", type=int, default=None)
+    work.add_argument("--wait", action="store_true", help="Keep polling while other workers hold jobs")
+
+    commands.add_parser("status", help="Show jobs with their status and timings")
+
+    args = parser.parse_args()
+    store = JobStore(args.queue)
+    if args.command == "enqueue":
+        branches = [branch.value for branch in Branch] if "all" in args.branch else args.branch
+        configs = [
+            DBSetupConfig(branch=branch, service_type=service_type, year=args.year, year_to=args.year_to,
+                          strict_validation=args.strict_validation, collection_workers=args.collection_workers,
+                          columnar_export=args.columnar_export, page_size=args.page_size,
+                          resume=args.resume)
+            for branch in branches for service_type in args.service_type
+        ]
+        print(f"Enqueued {store.enqueue(configs, max_attempts=args.max_attempts)} jobs")
+    elif args.command == "work":
+        QueueWorker(store, args.output_dir, worker=args.worker, lease_seconds=args.lease).run(
+            max_jobs=args.max_jobs, wait=args.wait)
+    else:
+        print_status(store)
@@ -0,0 +1,171 @@
+import hashlib
+import os
+import threading
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+from src.PolishNHSDataMongifyer.serialization import json_backend
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+MANIFEST_NAME = ".manifest.json"
+LOCK_NAME = ".manifest.lock"
+
+_directory_locks: Dict[str, threading.Lock] = {}
+_directory_locks_guard = threading.Lock()
+
+@contextmanager
+def _directory_lock(directory: str):
+    """Serialises manifest updates of a directory between threads and, through flock on its .manifest.lock, processes.
+
+    Without fcntl (Windows) only threads are serialised. Processes updating the manifest at the same time can then
+    drop each other's entries, which costs an extra rewrite or rebuild but never leaves a wrong hash behind.
+    """
+    with _directory_locks_guard:
+        lock = _directory_locks.setdefault(os.path.abspath(directory), threading.Lock())
+    with lock:
+        if fcntl is None:
+            yield
+            return
+        with open(os.path.join(directory, LOCK_NAME), "a") as lock_file:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+def temporary_path(path: str) -> str:
+    """Returns a hidden sibling of path that is unique to the calling process and thread, to write and then rename."""
+    directory, name = os.path.split(path)
+    return os.path.join(directory, f".{name}.tmp-{os.getpid()}-{threading.get_ident()}")
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+class DirectoryManifest:
+    """Content hashes of the files written to one directory, kept in its .manifest.json.
+
+    files maps file names to sha256 hashes of their content. stamps holds fingerprints of the inputs that
+    derived outputs were built from, so later stages can tell whether their inputs changed since the last run.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.path = os.path.join(directory, MANIFEST_NAME)
+        self.files: Dict[str, str] = {}
+        self.stamps: Dict[str, str] = {}
+        try:
+            manifest = json_backend.load(self.path)
+            self.files = manifest.get("files", {})
+            self.stamps = manifest.get("stamps", {})
+        except (FileNotFoundError, json_backend.JSONDecodeError):
+            pass
+
+    def save(self):
+        data = json_backend.dumps({"files": dict(sorted(self.files.items())),
+                                   "stamps": dict(sorted(self.stamps.items()))}, pretty=True)
+        tmp_path = temporary_path(self.path)
+        with open(tmp_path, "wb") as file:
+            file.write(data)
+        os.replace(tmp_path, self.path)
+
+def write_atomic(path: str, data: bytes) -> bool:
+    """Writes data through a temporary file and a rename, so readers never see a partially written file.
+
+    The write is skipped when the manifest of the directory already records the same content for an existing file.
+    Returns whether the file was written.
+    """
+    directory, name = os.path.split(path)
+    digest = content_hash(data)
+    with _directory_lock(directory):
+        manifest = DirectoryManifest(directory)
+        if manifest.files.get(name) == digest and os.path.exists(path):
+            return False
+        tmp_path = temporary_path(path)
+        try:
+            with open(tmp_path, "wb") as file:
+                file.write(data)
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        manifest.files[name] = digest
+        manifest.save()
+    return True
+
+class AtomicWriter:
+    """File-like writer for outputs too large to build in memory, with the same guarantees as write_atomic.
+
+    Content is streamed to a temporary file while being hashed; on close it replaces the target only if it changed.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.tmp_path = temporary_path(path)
+        self.hash = hashlib.sha256()
+        self.written = False
+        self._file = None
+
+    def __enter__(self) -> "AtomicWriter":
+        self._file = open(self.tmp_path, "wb")
+        return self
+
+    def write(self, data: bytes):
+        self.hash.update(data)
+        self._file.write(data)
+
+    def __exit__(self, exc_type, exc, tb):
+        self._file.close()
+        if exc_type is not None:
+            os.remove(self.tmp_path)
+            return False
+        directory, name = os.path.split(self.path)
+        digest = self.hash.hexdigest()
+        with _directory_lock(directory):
+            manifest = DirectoryManifest(directory)
+            if manifest.files.get(name) == digest and os.path.exists(self.path):
+                os.remove(self.tmp_path)
+                return False
+            os.replace(self.tmp_path, self.path)
+            manifest.files[name] = digest
+            manifest.save()
+        self.written = True
+        return False
+
+def file_hash(path: str) -> Optional[str]:
+    """Returns the content hash of a file, from its directory manifest when recorded there."""
+    directory, name = os.path.split(path)
+    recorded = DirectoryManifest(directory).files.get(name)
+    if recorded and os.path.exists(path):
+        return recorded
+    try:
+        with open(path, "rb") as file:
+            return content_hash(file.read())
+    except FileNotFoundError:
+        return None
+
+def is_recorded(path: str) -> bool:
+    """Whether the file exists and was written through the manifest, unlike e.g. empty placeholder files."""
+    directory, name = os.path.split(path)
+    return os.path.exists(path) and name in DirectoryManifest(directory).files
+
+def inputs_fingerprint(*paths, extra: str = "") -> str:
+    """Combines content hashes of input files into one value, stored as a stamp by the stage that consumed them."""
+    fingerprint = hashlib.sha256(extra.encode("utf-8"))
+    for path in paths:
+        fingerprint.update(f"{os.path.basename(path)}={file_hash(path)}\n".encode("utf-8"))
+    return fingerprint.hexdigest()
+
+def get_stamp(directory: str, stage: str) -> Optional[str]:
+    return DirectoryManifest(directory).stamps.get(stage)
+
+def set_stamp(directory: str, stage: str, fingerprint: str):
+    with _directory_lock(directory):
+        manifest = DirectoryManifest(directory)
+        manifest.stamps[stage] = fingerprint
+        manifest.save()
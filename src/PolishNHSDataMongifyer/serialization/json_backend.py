@@ -0,0 +1,124 @@
+import json
+import os
+from datetime import date, datetime
+from typing import Any, Callable, Optional
+
+from src.PolishNHSDataMongifyer.serialization import atomic_files
+from src.PolishNHSDataMongifyer.logging.logger import get_logger
+logger = get_logger(__name__)
+
+# Raised by every backend on malformed input, orjson errors already subclass it and msgspec errors are converted
+JSONDecodeError = json.JSONDecodeError
+
+# orjson can only indent by two spaces, the other backends follow it so that files, their manifest hashes and the
+# stamps derived from them do not depend on the installed backend
+INDENT = 2
+
+def _default(obj):
+    """Encodes dates and pydantic URLs, which are left in the output of model_dump() without mode="json"."""
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    # Only imported once such a value turns up, pydantic is not needed to write plain JSON types
+    from pydantic import AnyUrl
+    from pydantic_core import Url
+    if isinstance(obj, (AnyUrl, Url)):
+        return str(obj)
+    raise TypeError(f"Type {type(obj).__name__} is not JSON serializable")
+
+class JSONBackend:
+    """Pair of encode/decode functions working on bytes.
+
+    All backends produce the same bytes for the same object, except for the exponent notation of floats too large
+    or too small to be written out in full, and timezone-aware UTC datetimes, which msgspec writes with a Z suffix
+    instead of +00:00.
+    """
+
+    def __init__(self, name: str, dumps: Callable[[Any, bool], bytes], loads: Callable[[bytes], Any]):
+        self.name = name
+        self.dumps = dumps
+        self.loads = loads
+
+def _stdlib_backend() -> JSONBackend:
+    def dumps(obj, pretty: bool) -> bytes:
+        return json.dumps(obj, ensure_ascii=False, indent=INDENT if pretty else None,
+                          separators=(",", ": ") if pretty else (",", ":"), default=_default).encode("utf-8")
+
+    return JSONBackend("json", dumps, json.loads)
+
+def _orjson_backend() -> JSONBackend:
+    import orjson
+
+    def dumps(obj, pretty: bool) -> bytes:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if pretty else 0, default=_default)
+
+    return JSONBackend("orjson", dumps, orjson.loads)
+
+def _msgspec_backend() -> JSONBackend:
+    import msgspec
+
+    encoder = msgspec.json.Encoder(enc_hook=_default)
+    decoder = msgspec.json.Decoder()
+
+    def dumps(obj, pretty: bool) -> bytes:
+        data = encoder.encode(obj)
+        return msgspec.json.format(data, indent=INDENT) if pretty else data
+
+    def loads(data) -> Any:
+        try:
+            return decoder.decode(data)
+        except msgspec.DecodeError as e:
+            raise JSONDecodeError(str(e), data if isinstance(data, str) else data.decode("utf-8", "replace"), 0)
+
+    return JSONBackend("msgspec", dumps, loads)
+
+BACKEND_FACTORIES = {
+    "orjson": _orjson_backend,
+    "msgspec": _msgspec_backend,
+    "json": _stdlib_backend,
+}
+
+def create_backend(name: Optional[str] = None) -> JSONBackend:
+    """Creates the named backend, or the fastest installed one when name is None."""
+    if name is not None:
+        return BACKEND_FACTORIES[name]()
+    for factory in BACKEND_FACTORIES.values():
+        try:
+            return factory()
+        except ImportError:
+            continue
+
+_backend: Optional[JSONBackend] = None
+
+def get_backend() -> JSONBackend:
+    """Returns the backend selected with NHS_JSON_BACKEND (orjson, msgspec or json), falling back to the fastest installed one."""
+    global _backend
+    if _backend is None:
+        name = os.getenv("NHS_JSON_BACKEND")
+        try:
+            _backend = create_backend(name)
+        except (ImportError, KeyError):
+            logger.error(f"JSON backend '{name}' is not available, falling back to the fastest installed one")
+            _backend = create_backend()
+    return _backend
+
+def set_backend(name: str):
+    global _backend
+    _backend = create_backend(name)
+
+def pretty_output() -> bool:
+    """Whether files are indented, set NHS_JSON_PRETTY=0 to write compact files."""
+    return os.getenv("NHS_JSON_PRETTY", "1") != "0"
+
+def dumps(obj: Any, pretty: Optional[bool] = None) -> bytes:
+    return get_backend().dumps(obj, pretty_output() if pretty is None else pretty)
+
+def loads(data: bytes | str) -> Any:
+    return get_backend().loads(data)
+
+def load(path) -> Any:
+    with open(path, "rb") as file:
+        return loads(file.read())
+
+def dump(obj: Any, path, pretty: Optional[bool] = None) -> bool:
+    """Writes obj atomically, returns False when the file already had this content and was left untouched."""
+    return atomic_files.write_atomic(str(path), dumps(obj, pretty))
@@ -0,0 +1,219 @@
+import heapq
+import math
+import struct
+from array import array
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from src.PolishNHSDataMongifyer.serialization import json_backend
+from src.PolishNHSDataMongifyer.serialization.atomic_files import AtomicWriter
+from src.PolishNHSDataMongifyer.logging.logger import get_logger
+logger = get_logger(__name__)
+
+EARTH_RADIUS_KM = 6371.0088
+ALL_SERVICES = ""
+INDEX_MAGIC = b"NHSGEO1\n"
+
+@dataclass(slots=True)
+class ProviderLocation:
+    code: str
+    branch: str
+    lon: float
+    lat: float
+    service_types: Tuple[str, ...]
+
+def _to_unit_vector(lon: float, lat: float) -> Tuple[float, float, float]:
+    lon, lat = math.radians(lon), math.radians(lat)
+    return math.cos(lat) * math.cos(lon), math.cos(lat) * math.sin(lon), math.sin(lat)
+
+def _chord_to_km(chord: float) -> float:
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, chord / 2))
+
+def _km_to_chord(distance_km: float) -> float:
+    return 2 * math.sin(min(math.pi, distance_km / EARTH_RADIUS_KM) / 2)
+
+class _KDTree:
+    """Static 3-d tree over unit vectors, stored implicitly: the node of range [lo, hi) sits at (lo + hi) // 2.
+
+    Euclidean (chord) distance between unit vectors grows monotonically with great-circle distance,
+    so nearest neighbours in 3-d are nearest neighbours on the sphere.
+    """
+
+    def __init__(self, ids: array, coords: array):
+        self.ids = ids
+        self.coords = coords
+
+    @classmethod
+    def build(cls, points: List[Tuple[int, Tuple[float, float, float]]]) -> "_KDTree":
+        ordered = []
+
+        def place(items, depth):
+            if not items:
+                return
+            axis = depth % 3
+            items.sort(key=lambda item: item[1][axis])
+            mid = len(items) // 2
+            # Left subtree fills positions before the node and right subtree positions after it
+            left, node, right = items[:mid], items[mid], items[mid + 1:]
+            place(left, depth + 1)
+            ordered.append(node)
+            place(right, depth + 1)
+
+        place(list(points), 0)
+        ids = array("i", (point_id for point_id, _ in ordered))
+        coords = array("d", (value for _, vector in ordered for value in vector))
+        return cls(ids, coords)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def nearest(self, query, k: int, accept: Callable[[int], bool]) -> List[Tuple[float, int]]:
+        ids, coords = self.ids, self.coords
+        heap = []
+
+        def visit(lo, hi, depth):
+            if lo >= hi:
+                return
+            mid = (lo + hi) // 2
+            base = 3 * mid
+            dx = query[0] - coords[base]
+            dy = query[1] - coords[base + 1]
+            dz = query[2] - coords[base + 2]
+            distance = dx * dx + dy * dy + dz * dz
+            if (len(heap) < k or distance < -heap[0][0]) and accept(ids[mid]):
+                if len(heap) < k:
+                    heapq.heappush(heap, (-distance, ids[mid]))
+                else:
+                    heapq.heapreplace(heap, (-distance, ids[mid]))
+            diff = query[depth % 3] - coords[base + depth % 3]
+            near, far = ((lo, mid), (mid + 1, hi)) if diff < 0 else ((mid + 1, hi), (lo, mid))
+            visit(near[0], near[1], depth + 1)
+            if len(heap) < k or diff * diff < -heap[0][0]:
+                visit(far[0], far[1], depth + 1)
+
+        visit(0, len(ids), 0)
+        return sorted((math.sqrt(-distance), point_id) for distance, point_id in heap)
+
+    def within(self, query, chord: float, accept: Callable[[int], bool]) -> List[Tuple[float, int]]:
+        ids, coords = self.ids, self.coords
+        limit = chord * chord
+        found = []
+
+        def visit(lo, hi, depth):
+            if lo >= hi:
+                return
+            mid = (lo + hi) // 2
+            base = 3 * mid
+            dx = query[0] - coords[base]
+            dy = query[1] - coords[base + 1]
+            dz = query[2] - coords[base + 2]
+            distance = dx * dx + dy * dy + dz * dz
+            if distance <= limit and accept(ids[mid]):
+                found.append((math.sqrt(distance), ids[mid]))
+            diff = query[depth % 3] - coords[base + depth % 3]
+            if diff < 0 or diff * diff <= limit:
+                visit(lo, mid, depth + 1)
+            if diff >= 0 or diff * diff <= limit:
+                visit(mid + 1, hi, depth + 1)
+
+        visit(0, len(ids), 0)
+        found.sort()
+        return found
+
+class ProviderSpatialIndex:
+    """In-process index of provider locations answering k-nearest and radius queries.
+
+    A separate tree is kept for every service type, so filtering by service never scans providers of other
+    services. Branch filtering is applied while traversing the tree. Distances are returned in kilometres.
+    """
+
+    def __init__(self, locations: List[ProviderLocation], trees: Dict[str, _KDTree] = None):
+        self.locations = locations
+        self.trees = trees if trees is not None else self._build_trees(locations)
+
+    @staticmethod
+    def _build_trees(locations: List[ProviderLocation]) -> Dict[str, _KDTree]:
+        points_by_service = {ALL_SERVICES: []}
+        for location_id, location in enumerate(locations):
+            point = (location_id, _to_unit_vector(location.lon, location.lat))
+            points_by_service[ALL_SERVICES].append(point)
+            for service_type in location.service_types:
+                points_by_service.setdefault(service_type, []).append(point)
+        return {service_type: _KDTree.build(points) for service_type, points in points_by_service.items()}
+
+    @classmethod
+    def from_collections(cls, collection_paths: Iterable[Tuple[str, str]]) -> "ProviderSpatialIndex":
+        """Builds the index from (ProvidersGeoCollection, AgreementsCollection) file path pairs.
+
+        Service types of a provider are taken from its agreements, so several branches and services can be
+        combined into a single index by passing their collection pairs.
+        """
+        service_types: Dict[str, set] = {}
+        locations: Dict[str, Tuple[str, float, float]] = {}
+        for geo_collection_path, agreements_collection_path in collection_paths:
+            for agreement in json_backend.load(agreements_collection_path):
+                service_types.setdefault(agreement["provider_code"], set()).add(agreement["service_type"])
+            for entry in json_backend.load(geo_collection_path):
+                lon, lat = entry["location"]["coordinates"]
+                locations.setdefault(entry["code"], (entry["voivodeship"], lon, lat))
+
+        return cls([
+            ProviderLocation(code, branch, lon, lat, tuple(sorted(service_types.get(code, ()))))
+            for code, (branch, lon, lat) in locations.items()
+        ])
+
+    def _accept(self, branch: Optional[str]) -> Callable[[int], bool]:
+        if branch is None:
+            return lambda location_id: True
+        locations = self.locations
+        return lambda location_id: locations[location_id].branch == branch
+
+    def nearest(self, lon: float, lat: float, k: int = 1, service_type: str = None,
+                branch: str = None) -> List[Tuple[ProviderLocation, float]]:
+        tree = self.trees.get(service_type or ALL_SERVICES)
+        if tree is None or k < 1:
+            return []
+        found = tree.nearest(_to_unit_vector(lon, lat), k, self._accept(branch))
+        return [(self.locations[location_id], _chord_to_km(chord)) for chord, location_id in found]
+
+    def within_radius(self, lon: float, lat: float, radius_km: float, service_type: str = None,
+                      branch: str = None) -> List[Tuple[ProviderLocation, float]]:
+        tree = self.trees.get(service_type or ALL_SERVICES)
+        if tree is None:
+            return []
+        found = tree.within(_to_unit_vector(lon, lat), _km_to_chord(radius_km), self._accept(branch))
+        return [(self.locations[location_id], _chord_to_km(chord)) for chord, location_id in found]
+
+    def save(self, path):
+        """Writes the index with its prebuilt trees, so loading does not repeat the build."""
+        header = {
+            "locations": [[location.code, location.branch, location.lon, location.lat, list(location.service_types)]
+                          for location in self.locations],
+            "trees": {service_type: len(tree) for service_type, tree in self.trees.items()},
+        }
+        header_bytes = json_backend.dumps(header, pretty=False)
+        with AtomicWriter(str(path)) as file:
+            file.write(INDEX_MAGIC)
+            file.write(struct.pack("<Q", len(header_bytes)))
+            file.write(header_bytes)
+            for tree in self.trees.values():
+                file.write(tree.ids.tobytes())
+                file.write(tree.coords.tobytes())
+
+    @classmethod
+    def load(cls, path) -> "ProviderSpatialIndex":
+        with open(path, "rb") as file:
+            if file.read(len(INDEX_MAGIC)) != INDEX_MAGIC:
+                raise ValueError(f"{path} is not a provider spatial index file")
+            (header_size,) = struct.unpack("<Q", file.read(8))
+            header = json_backend.loads(file.read(header_size))
+            trees = {}
+            for service_type, size in header["trees"].items():
+                ids, coords = array("i"), array("d")
+                ids.frombytes(file.read(size * ids.itemsize))
+                coords.frombytes(file.read(3 * size * coords.itemsize))
+                trees[service_type] = _KDTree(ids, coords)
+
+        locations = [ProviderLocation(code, branch, lon, lat, tuple(service_types))
+                     for code, branch, lon, lat, service_types in header["locations"]]
+        return cls(locations, trees)
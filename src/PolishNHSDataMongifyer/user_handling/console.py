@@ -1,5 +1,4 @@
 import os
-from src.PolishNHSDataMongifyer.collection_setup.db_setup import DatabaseSetup
 from src.PolishNHSDataMongifyer.data_models.nhs_api_models import Branch, ServiceType
 from src.PolishNHSDataMongifyer.data_models.custom_models import DBSetupConfig
 from src.PolishNHSDataMongifyer.validation.validation import Validation
@@ -73,7 +72,20 @@ class Console:
             else:
                 print("Nieprawidłowy kod, spróbuj ponownie.")
 
-        self.configurations.append((Branch(voivodeship), ServiceType(service_type)))
+        # Choose year or range of years
+        while True:
+            years = input("Podaj rok lub zakres lat (np. 2025 lub 2016-2025): ").strip()
+            try:
+                year, _, year_to = years.partition("-")
+                year = int(year)
+                year_to = int(year_to) if year_to else None
+                if year_to is None or year_to >= year:
+                    break
+                print("Nieprawidłowy zakres lat, spróbuj ponownie.")
+            except ValueError:
+                print("Proszę podać rok lub zakres lat.")
+
+        self.configurations.append((Branch(voivodeship), ServiceType(service_type), year, year_to))
         print("Konfiguracja została dodana!")
         input("Naciśnij Enter, aby kontynuować...")
     
@@ -85,8 +97,8 @@ class Console:
             return
         
         print("Lista zapisanych konfiguracji:")
-        for idx, (voivodeship, service) in enumerate(self.configurations, 1):
-            print(f"{idx}. {voivodeship.name} - {service.name}")
+        for idx, (voivodeship, service, year, year_to) in enumerate(self.configurations, 1):
+            print(f"{idx}. {voivodeship.name} - {service.name} - {self.format_years(year, year_to)}")
         
         while True:
             try:
@@ -107,16 +119,23 @@ class Console:
             print("Brak zapisanych konfiguracji.")
         else:
             print("Lista zapisanych konfiguracji:")
-            for idx, (voivodeship, service) in enumerate(self.configurations, 1):
-                print(f"{idx}. {voivodeship.name} - {service.name}")
+            for idx, (voivodeship, service, year, year_to) in enumerate(self.configurations, 1):
+                print(f"{idx}. {voivodeship.name} - {service.name} - {self.format_years(year, year_to)}")
         input("Naciśnij Enter, aby wrócić...")
 
+    @staticmethod
+    def format_years(year, year_to):
+        return f"{year}-{year_to}" if year_to else str(year)
+
     def return_configs(self):
         self.clear_screen()
 
         config_list = []
-        for idx, (voivodeship, service) in enumerate(self.configurations, 1):
-            config = { "branch": voivodeship.value, "year": 2025, "service_type": service.value }
+        for idx, (voivodeship, service, year, year_to) in enumerate(self.configurations, 1):
+            config = { "branch": voivodeship.value, "year": year, "year_to": year_to, "service_type": service.value,
+                       "collection_workers": int(os.getenv("NHS_COLLECTION_WORKERS", 1)),
+                       "columnar_export": os.getenv("NHS_COLUMNAR_EXPORT", "0") == "1",
+                       "resume": os.getenv("NHS_RESUME_FETCH", "0") == "1" }
             config_list.append(config)
         cfgs = Validation.validate_list(config_list, DBSetupConfig)
         return cfgs
\ No newline at end of file
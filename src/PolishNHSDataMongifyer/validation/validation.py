@@ -1,10 +1,15 @@
-from datetime import date, datetime
 import traceback
+from functools import lru_cache
 from typing import Any, List, Type
-from pydantic import BaseModel, HttpUrl, TypeAdapter, ValidationError
+from pydantic import BaseModel, TypeAdapter, ValidationError
 from src.PolishNHSDataMongifyer.logging.logger import get_logger
 logger = get_logger(__name__)
 
+@lru_cache(maxsize=None)
+def _list_adapter(model: Type[BaseModel]) -> TypeAdapter:
+    # Building a TypeAdapter compiles a validator, which is too costly to repeat on every call
+    return TypeAdapter(List[model])
+
 class Validation:
     @staticmethod
     def validate(variable: Any, model: Type[BaseModel]) -> BaseModel:
@@ -18,19 +23,9 @@ class Validation:
     @staticmethod
     def validate_list(items: List[Any], model: Type[BaseModel]) -> List[BaseModel]:
         try:
-            return TypeAdapter(List[model]).validate_python(items)
+            return _list_adapter(model).validate_python(items)
         except ValidationError as e:
             logger.error(f"Validation failed: {str(e)}")
             logger.error(traceback.format_exc())
             raise
-
-    @staticmethod
-    def json_serial(obj):
-        """JSON serializer for objects not serializable by default json code"""
-
-        if isinstance(obj, (datetime, date)):
-            return obj.isoformat()
-        if isinstance(obj, HttpUrl):
-            return str(obj)
-        raise TypeError ("Type %s not serializable" % type(obj))
     
\ No newline at end of file
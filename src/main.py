@@ -1,8 +1,5 @@
 import os
-from src.PolishNHSDataMongifyer.collection_setup.db_setup import DatabaseSetup
 from src.PolishNHSDataMongifyer.data_models.custom_models import DBSetupConfig
-from src.PolishNHSDataMongifyer.data_processing.file_manager import FileDataManagement
-from src.PolishNHSDataMongifyer.data_processing.processor import HealthcareDataProcessing
 from src.PolishNHSDataMongifyer.user_handling.console import Console
 from src.PolishNHSDataMongifyer.validation.validation import Validation
 
@@ -13,9 +10,19 @@ def main():
     configs = console.display_menu()
     validated_configs = Validation.validate_list(configs, DBSetupConfig)
 
+    # The pipeline is imported only once there is something to run, so the menu shows up without waiting for it
+    from src.PolishNHSDataMongifyer.collection_setup.backfill import HistoricalBackfill
+    from src.PolishNHSDataMongifyer.collection_setup.db_setup import DatabaseSetup
+    from src.PolishNHSDataMongifyer.data_processing.file_manager import FileDataManagement
+    from src.PolishNHSDataMongifyer.data_processing.processor import HealthcareDataProcessing
+
     for config in validated_configs:
-        file_manager = FileDataManagement(config.branch, config.service_type, current_folder)
-        processor = HealthcareDataProcessing(config.branch, config.service_type, file_manager)
+        if config.year_to is not None:
+            HistoricalBackfill(config, current_folder).run()
+            continue
+        file_manager = FileDataManagement(config.branch, config.service_type, current_folder, config.year)
+        processor = HealthcareDataProcessing(config.branch, config.service_type, file_manager,
+                                             strict_validation=config.strict_validation)
         DatabaseSetup(config, processor)
 
 if __name__ == "__main__":
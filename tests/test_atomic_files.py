@@ -0,0 +1,87 @@
+import os
+
+import pytest
+
+from src.PolishNHSDataMongifyer.serialization.atomic_files import (MANIFEST_NAME, AtomicWriter, DirectoryManifest,
+                                                                   content_hash, file_hash, get_stamp,
+                                                                   inputs_fingerprint, is_recorded, set_stamp,
+                                                                   write_atomic)
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "Collection.json")
+
+def temporary_files(path):
+    return [name for name in os.listdir(os.path.dirname(path)) if ".tmp-" in name]
+
+def write_streamed(path, *chunks):
+    with AtomicWriter(path) as writer:
+        for chunk in chunks:
+            writer.write(chunk)
+    return writer.written
+
+def test_write_atomic_skips_unchanged_content(path):
+    assert write_atomic(path, b"[1, 2]")
+    modified = os.stat(path).st_mtime_ns
+    assert not write_atomic(path, b"[1, 2]")
+    assert os.stat(path).st_mtime_ns == modified
+
+    assert write_atomic(path, b"[3]")
+    with open(path, "rb") as file:
+        assert file.read() == b"[3]"
+    assert DirectoryManifest(os.path.dirname(path)).files == {"Collection.json": content_hash(b"[3]")}
+
+def test_write_atomic_rewrites_removed_or_unrecorded_files(path):
+    write_atomic(path, b"[1]")
+    os.remove(path)
+    assert write_atomic(path, b"[1]")
+
+    os.remove(os.path.join(os.path.dirname(path), MANIFEST_NAME))
+    assert write_atomic(path, b"[1]")
+
+def test_atomic_writer_skips_unchanged_content(path):
+    assert write_streamed(path, b"[1", b", 2]")
+    assert not write_streamed(path, b"[1, ", b"2]")
+    assert not write_atomic(path, b"[1, 2]")
+    assert write_streamed(path, b"[]")
+    assert not temporary_files(path)
+
+def test_atomic_writer_keeps_the_file_on_error(path):
+    write_atomic(path, b"[1]")
+    with pytest.raises(RuntimeError):
+        with AtomicWriter(path) as writer:
+            writer.write(b"[2")
+            raise RuntimeError("interrupted")
+    with open(path, "rb") as file:
+        assert file.read() == b"[1]"
+    assert not temporary_files(path)
+
+def test_placeholder_files_are_not_recorded(path):
+    open(path, "wb").close()
+    assert not is_recorded(path)
+    assert file_hash(path) == content_hash(b"")
+    write_atomic(path, b"[]")
+    assert is_recorded(path)
+
+def test_fingerprint_changes_with_input_content(tmp_path, path):
+    other_path = str(tmp_path / "Other.json")
+    write_atomic(path, b"[1]")
+    write_atomic(other_path, b"[2]")
+    fingerprint = inputs_fingerprint(path, other_path, extra="strict")
+    assert inputs_fingerprint(path, other_path, extra="strict") == fingerprint
+    assert inputs_fingerprint(path, other_path, extra="fast") != fingerprint
+
+    # Files changed without the manifest are hashed from their content
+    with open(other_path, "wb") as file:
+        file.write(b"[3]")
+    os.remove(os.path.join(str(tmp_path), MANIFEST_NAME))
+    assert inputs_fingerprint(path, other_path, extra="strict") != fingerprint
+
+def test_stamps_are_kept_next_to_file_hashes(tmp_path, path):
+    directory = str(tmp_path)
+    assert get_stamp(directory, "collections") is None
+    write_atomic(path, b"[1]")
+    set_stamp(directory, "collections", "abc")
+    write_atomic(path, b"[2]")
+    assert get_stamp(directory, "collections") == "abc"
+    assert is_recorded(path)
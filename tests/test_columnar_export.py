@@ -0,0 +1,44 @@
+import os
+
+import pytest
+
+from src.PolishNHSDataMongifyer.collection_setup.columnar_export import DATASETS, ColumnarExport, read_export
+from src.PolishNHSDataMongifyer.data_models.nhs_api_models import Branch, ServiceType
+from src.PolishNHSDataMongifyer.data_processing.file_manager import FileDataManagement
+from src.PolishNHSDataMongifyer.serialization import json_backend
+
+pytest.importorskip("pyarrow")
+
+@pytest.fixture
+def file_manager(tmp_path):
+    file_manager = FileDataManagement(Branch.Mazowieckie, ServiceType.Leczenie_Szpitalne, tmp_path / "main.py", 2025)
+    file_manager.setup_file_structure()
+    json_backend.dump([{"id": "2025-07-1", "code": "C1", "origin_code": "o", "service_type": "03",
+                        "service_name": "svc", "amount": 1250.5, "provider_code": "0700001", "year": 2025}],
+                      file_manager.AGREEMENTS_COLLECTION)
+    json_backend.dump([{"code": "0700001", "nip": "1", "regon": "2", "registry_number": "3", "name": "N",
+                        "phone": None, "agreements": ["2025-07-1"]}], file_manager.PROVIDERS_COLLECTION)
+    json_backend.dump([{"code": "0700001", "city": "Warszawa", "street": "Długa", "building_number": "5",
+                        "district": None, "post_code": "00-001", "voivodeship": "07", "precision": "address",
+                        "location": {"type": "Point", "coordinates": [21.0, 52.2]}}],
+                      file_manager.PROVIDERS_GEO_COLLECTION)
+    return file_manager
+
+def test_export_writes_only_parquet_files_into_partitions(file_manager):
+    export = ColumnarExport(file_manager)
+    export.export()
+    for dataset in DATASETS:
+        assert os.listdir(os.path.dirname(export.dataset_file(dataset))) == ["part-0.parquet"]
+
+    agreements = read_export(export.EXPORT_DIR, "Agreements").to_pylist()
+    assert [(row["id"], row["amount"], row["branch"], row["year"]) for row in agreements] == [
+        ("2025-07-1", 1250.5, "07", 2025)]
+    geo = read_export(export.EXPORT_DIR, "ProvidersGeo", columns=["lon", "lat"]).to_pylist()
+    assert geo == [{"lon": 21.0, "lat": 52.2}]
+
+def test_unchanged_export_is_not_rewritten(file_manager):
+    export = ColumnarExport(file_manager)
+    export.export()
+    modified = {dataset: os.stat(export.dataset_file(dataset)).st_mtime_ns for dataset in DATASETS}
+    export.export()
+    assert {dataset: os.stat(export.dataset_file(dataset)).st_mtime_ns for dataset in DATASETS} == modified
@@ -0,0 +1,78 @@
+import os
+
+import pytest
+
+from src.PolishNHSDataMongifyer.data_models.nhs_api_models import ServiceType
+from src.PolishNHSDataMongifyer.data_processing.file_manager import FileDataManagement
+from src.PolishNHSDataMongifyer.serialization import json_backend
+
+@pytest.fixture
+def manager(tmp_path):
+    manager = FileDataManagement("07", ServiceType.Leczenie_Szpitalne, tmp_path / "main.py", 2025)
+    manager.setup_file_structure()
+    return manager
+
+def save_pages(manager, *pages):
+    """Saves pages given as (offset, number of agreements) pairs."""
+    for offset, count in pages:
+        manager.save_agreements_page([{"id": offset + i} for i in range(count)], offset)
+
+def saved_offsets(manager):
+    return [manager.agreement_page_offset(os.path.basename(page)) for page in manager.list_agreement_pages()]
+
+@pytest.mark.parametrize("filename, offset", [
+    ("Offset0.json", 0),
+    ("Offset250.json", 250),
+    ("Page1_limit25.json", 0),
+    ("Page3_limit25.json", 50),
+    ("Offset250.json.tmp", None),
+    ("OffsetX.json", None),
+    ("Page2.json", None),
+    (".manifest.json", None),
+])
+def test_agreement_page_offset(filename, offset):
+    assert FileDataManagement.agreement_page_offset(filename) == offset
+
+def test_pages_are_listed_by_offset(manager):
+    save_pages(manager, (100, 50), (0, 50), (50, 50))
+    json_backend.dump([], os.path.join(manager.AGREEMENTS_DATA_DIR, "Page2_limit25.json"))
+    assert saved_offsets(manager) == [0, 25, 50, 100]
+
+def test_resume_offset_refetches_last_page_and_removes_later_ones(manager):
+    save_pages(manager, (0, 25), (25, 25), (50, 25), (75, 10))
+    assert manager.get_agreements_resume_offset() == 75
+    assert saved_offsets(manager) == [0, 25, 50, 75]
+
+    # Only a page starting at a multiple of the new page size can be refetched with it
+    assert manager.get_agreements_resume_offset(alignment=50) == 50
+    assert saved_offsets(manager) == [0, 25, 50]
+
+def test_resume_offset_without_pages(manager):
+    assert manager.get_agreements_resume_offset(alignment=100) == 0
+
+def test_overlapping_pages_are_removed(manager):
+    save_pages(manager, (0, 25), (25, 25), (50, 25), (75, 25), (100, 25), (125, 5))
+    save_pages(manager, (60, 30))
+
+    manager.remove_overlapping_agreement_pages(["Offset60.json"], 60, 90)
+    # Offset50 ends past 60 and Offset75 starts inside the range, the pages around them still cover the rest
+    assert saved_offsets(manager) == [0, 25, 60, 100, 125]
+
+def test_stale_pages_are_removed(manager):
+    save_pages(manager, (0, 25), (25, 25), (50, 5))
+    json_backend.dump([], os.path.join(manager.AGREEMENTS_DATA_DIR, "Page1_limit25.json"))
+    manager.remove_stale_agreement_pages(["Offset0.json", "Offset25.json"])
+    assert saved_offsets(manager) == [0, 25]
+
+def test_page_sizes_of_saved_pages(manager):
+    save_pages(manager, (0, 50), (50, 50), (100, 20))
+    assert manager.get_agreement_page_sizes() == {0: 50, 50: 50, 100: 50}
+
+def test_page_sizes_skip_unaligned_pages(manager):
+    # The fetch was resumed with a smaller page size after a rejected request
+    save_pages(manager, (0, 100), (100, 30), (130, 30), (160, 10))
+    assert manager.get_agreement_page_sizes() == {0: 100}
+
+def test_page_size_of_a_single_page_is_unknown(manager):
+    save_pages(manager, (0, 10))
+    assert manager.get_agreement_page_sizes() == {}
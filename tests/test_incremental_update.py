@@ -0,0 +1,72 @@
+import os
+
+import pytest
+
+from src.PolishNHSDataMongifyer.collection_setup.db_setup import DatabaseSetup
+from src.PolishNHSDataMongifyer.data_models.custom_models import DBSetupConfig
+from src.PolishNHSDataMongifyer.data_processing.file_manager import FileDataManagement
+from src.PolishNHSDataMongifyer.data_processing.processor import HealthcareDataProcessing
+from src.PolishNHSDataMongifyer.serialization import json_backend
+
+PROVIDERS = [f"07{number:05d}" for number in range(6)]
+PAGE_SIZE = 10
+PAGES = 4
+
+def agreement(number):
+    provider_code = PROVIDERS[number * 7 % len(PROVIDERS)]
+    return {"id": f"2025-07-{number}", "type": "agreement", "attributes": {
+        "code": f"C{number}", "technical-code": "t", "origin-code": "o", "service-type": "04",
+        "service-name": "svc", "amount": 0 if number % 13 == 0 else 1000 + number * 37,
+        "updated-at": "2025-01-02T03:04:05", "provider-code": provider_code, "provider-nip": "1",
+        "provider-regon": "2", "provider-registry-number": "3", "provider-name": "N", "provider-place": "Warszawa",
+        "year": 2025, "branch": "07"}, "links": {"related": "https://api.nfz.gov.pl/x"}}
+
+@pytest.fixture
+def config():
+    return DBSetupConfig(branch="07", service_type="04", year=2025)
+
+@pytest.fixture
+def file_manager(tmp_path, config):
+    file_manager = FileDataManagement(config.branch, config.service_type, tmp_path / "main.py", config.year)
+    file_manager.setup_file_structure()
+    json_backend.dump([{"type": "dictionary-provider-entry", "attributes": {
+        "branch": "07", "code": code, "name": f"Provider {code}", "nip": "1", "regon": "2", "registry-number": "3",
+        "post-code": "00-001", "street": "ul. Długa 5", "place": "Warszawa", "phone": None, "commune": "W"}}
+        for code in PROVIDERS], file_manager.PROVIDERS_DATA)
+    json_backend.dump([{"provider-code": code, "provider-branch": "07", "geo-data": {
+        "datasource": {"sourcename": "osm", "attribution": "a", "license": "l", "url": None},
+        "city": "Warszawa", "postcode": "00-001", "street": "Długa", "housenumber": "5", "district": None,
+        "lon": 21.0 + index / 10, "lat": 52.0 + index / 10}} for index, code in enumerate(PROVIDERS)],
+        file_manager.PROVIDERS_GEO_DATA)
+    return file_manager
+
+def save_pages(file_manager, pages):
+    for page in pages:
+        offset = page * PAGE_SIZE
+        file_manager.save_agreements_page([agreement(number) for number in range(offset, offset + PAGE_SIZE)], offset)
+
+def build(config, file_manager):
+    setup = DatabaseSetup(config, HealthcareDataProcessing(config.branch, config.service_type, file_manager),
+                          fetch_data=False)
+    assert setup.collections_built
+    return {path: json_backend.load(path) for path in setup.get_collection_paths() if path.endswith(".json")}
+
+def test_added_pages_extend_collections_as_a_full_rebuild(config, file_manager):
+    save_pages(file_manager, range(2))
+    build(config, file_manager)
+    save_pages(file_manager, range(2, PAGES))
+    updated = build(config, file_manager)
+
+    os.remove(os.path.join(file_manager.COLLECTION_DIR, ".manifest.json"))
+    rebuilt = build(config, file_manager)
+    assert updated == rebuilt
+    assert len(rebuilt[file_manager.AGREEMENTS_COLLECTION]) == PAGES * PAGE_SIZE - 4
+
+def test_changed_page_rebuilds_collections(config, file_manager):
+    save_pages(file_manager, range(PAGES))
+    build(config, file_manager)
+    file_manager.save_agreements_page([agreement(number) for number in range(PAGE_SIZE, PAGE_SIZE + 5)], PAGE_SIZE)
+    updated = build(config, file_manager)
+
+    agreement_ids = [entry["id"] for entry in updated[file_manager.AGREEMENTS_COLLECTION]]
+    assert "2025-07-15" not in agreement_ids and "2025-07-35" in agreement_ids
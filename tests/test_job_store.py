@@ -0,0 +1,102 @@
+import pytest
+
+from src.PolishNHSDataMongifyer.data_models.custom_models import DBSetupConfig
+from src.PolishNHSDataMongifyer.job_queue import job_store
+from src.PolishNHSDataMongifyer.job_queue.job_store import JobStore
+
+LEASE = 60
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr(job_store.time, "time", lambda: now[0])
+    return now
+
+@pytest.fixture
+def store(tmp_path, clock):
+    return JobStore(str(tmp_path / "queue.db"))
+
+def config(branch="07", service_type="04", year=2025, year_to=None):
+    return DBSetupConfig(branch=branch, service_type=service_type, year=year, year_to=year_to)
+
+def test_enqueue_adds_a_job_per_year(store):
+    assert store.enqueue([config(year=2023, year_to=2025)]) == 3
+    jobs = store.jobs()
+    assert [job.year for job in jobs] == [2023, 2024, 2025]
+    assert all(job.status == "pending" for job in jobs)
+    assert jobs[0].to_config().year == 2023 and jobs[0].to_config().year_to is None
+
+def test_enqueue_resets_only_finished_jobs(store):
+    store.enqueue([config(year=2024, year_to=2025)])
+    first = store.lease("a", LEASE)
+    store.complete(first.id, "a", 1.0, 2.0)
+    store.lease("a", LEASE)
+
+    assert store.enqueue([config(year=2024, year_to=2025)]) == 1
+    assert [job.status for job in store.jobs()] == ["pending", "running"]
+    assert store.jobs()[0].attempts == 0
+
+def test_lease_takes_oldest_pending_job(store):
+    store.enqueue([config(branch="07"), config(branch="12")])
+    job = store.lease("a", LEASE)
+    assert (job.branch, job.status, job.worker, job.attempts) == ("07", "running", "a", 1)
+    assert job.lease_expires == job_store.time.time() + LEASE
+
+def test_jobs_of_same_branch_and_service_are_exclusive(store):
+    store.enqueue([config(year=2024, year_to=2025), config(service_type="05")])
+    first = store.lease("a", LEASE)
+    second = store.lease("b", LEASE)
+    assert (first.service_type, first.year) == ("04", 2024)
+    assert (second.service_type, second.year) == ("05", 2025)
+    assert store.lease("c", LEASE) is None
+
+    store.complete(first.id, "a", 1.0, 1.0)
+    third = store.lease("c", LEASE)
+    assert (third.service_type, third.year) == ("04", 2025)
+
+def test_heartbeat_extends_the_lease(store, clock):
+    store.enqueue([config()])
+    job = store.lease("a", LEASE)
+    clock[0] += LEASE - 1
+    assert store.heartbeat(job.id, "a", LEASE)
+    clock[0] += LEASE - 1
+    assert store.lease("b", LEASE) is None
+    assert store.complete(job.id, "a", 1.0, 1.0)
+    assert store.jobs()[0].status == "done"
+
+def test_expired_lease_is_taken_over(store, clock):
+    store.enqueue([config()])
+    job = store.lease("a", LEASE)
+    clock[0] += LEASE + 1
+
+    taken_over = store.lease("b", LEASE)
+    assert (taken_over.id, taken_over.worker, taken_over.attempts) == (job.id, "b", 2)
+    # The worker that lost the lease can neither extend it nor record a result
+    assert not store.heartbeat(job.id, "a", LEASE)
+    assert not store.complete(job.id, "a", 1.0, 1.0)
+    assert not store.fail(job.id, "a", "error")
+    assert store.jobs()[0].worker == "b"
+
+def test_expired_lease_of_last_attempt_fails_the_job(store, clock):
+    store.enqueue([config()], max_attempts=1)
+    store.lease("a", LEASE)
+    clock[0] += LEASE + 1
+
+    assert store.lease("b", LEASE) is None
+    job = store.jobs()[0]
+    assert job.status == "failed" and job.error == "Lease expired after the last attempt"
+    assert not store.has_unfinished_jobs()
+
+def test_fail_retries_until_max_attempts(store):
+    store.enqueue([config()], max_attempts=2)
+    job = store.lease("a", LEASE)
+    assert store.fail(job.id, "a", "RuntimeError: first")
+    assert store.jobs()[0].status == "pending"
+
+    job = store.lease("b", LEASE)
+    assert job.attempts == 2 and job.error is None
+    assert store.fail(job.id, "b", "RuntimeError: second")
+    job = store.jobs()[0]
+    assert (job.status, job.error) == ("failed", "RuntimeError: second")
+    assert store.lease("c", LEASE) is None
+    assert store.counts() == {"failed": 1}
@@ -0,0 +1,69 @@
+import os
+import random
+
+import pytest
+
+from src.PolishNHSDataMongifyer.collection_setup.national_merge import NationalMerge
+from src.PolishNHSDataMongifyer.serialization import json_backend
+
+CONFIGURATIONS = [("SERVICE[Leczenie_Szpitalne]", "Mazowieckie"), ("SERVICE[Leczenie_Szpitalne]", "Slaskie"),
+                  ("SERVICE[Rehabilitacja_Lecznicza]", "Mazowieckie")]
+
+@pytest.fixture
+def output_dir(tmp_path):
+    rng = random.Random(34)
+    for service, branch in CONFIGURATIONS:
+        collection_dir = tmp_path / service / branch / "2025" / "Collections"
+        collection_dir.mkdir(parents=True)
+        codes = rng.sample(range(40), 25)
+        json_backend.dump([{"code": f"{code:06d}", "name": f"{branch} {code}",
+                            "agreements": [f"{service}-{code}-{number}" for number in range(rng.randint(0, 3))]
+                                          + [f"shared-{code}"]} for code in codes],
+                          collection_dir / "ProvidersInfoCollection.json")
+        json_backend.dump([{"code": f"{code:06d}", "voivodeship": branch} for code in codes],
+                          collection_dir / "ProvidersGeoCollection.json")
+        json_backend.dump([{"id": f"{rng.randint(0, 60)}", "source": f"{service}/{branch}"} for _ in range(30)],
+                          collection_dir / "AgreementsCollection.json")
+    return tmp_path
+
+def load_inputs(output_dir, file_name):
+    return [json_backend.load(os.path.join(output_dir, service, branch, "2025", "Collections", file_name))
+            for service, branch in CONFIGURATIONS]
+
+def first_by_key(collections, key):
+    merged = {}
+    for collection in collections:
+        for entry in collection:
+            merged.setdefault(entry[key], entry)
+    return [merged[value] for value in sorted(merged)]
+
+@pytest.mark.parametrize("run_size", [7, 100000])
+def test_merge_dedupes_like_a_dictionary(output_dir, run_size):
+    merge = NationalMerge(str(output_dir), year=2025, run_size=run_size)
+    merge.run()
+
+    def merged(file_name):
+        return json_backend.load(os.path.join(merge.NATIONAL_COLLECTION_DIR, file_name))
+
+    assert merged("ProvidersGeoCollection.json") == first_by_key(load_inputs(output_dir, "ProvidersGeoCollection.json"), "code")
+    assert merged("AgreementsCollection.json") == first_by_key(load_inputs(output_dir, "AgreementsCollection.json"), "id")
+
+    providers = load_inputs(output_dir, "ProvidersInfoCollection.json")
+    expected = first_by_key(providers, "code")
+    for provider in expected:
+        entries = [entry for collection in providers for entry in collection if entry["code"] == provider["code"]]
+        provider["agreements"] = list(dict.fromkeys(agreement for entry in entries for agreement in entry["agreements"]))
+    assert merged("ProvidersInfoCollection.json") == expected
+
+def test_merge_skips_unchanged_inputs(output_dir):
+    merge = NationalMerge(str(output_dir), year=2025, run_size=7)
+    merge.run()
+    output_path = os.path.join(merge.NATIONAL_COLLECTION_DIR, "AgreementsCollection.json")
+    modified = os.stat(output_path).st_mtime_ns
+    merge.run()
+    assert os.stat(output_path).st_mtime_ns == modified
+
+    collection_path = os.path.join(output_dir, *CONFIGURATIONS[0], "2025", "Collections", "AgreementsCollection.json")
+    json_backend.dump([{"id": "999", "source": "new"}], collection_path)
+    merge.run()
+    assert {"id": "999", "source": "new"} in json_backend.load(output_path)
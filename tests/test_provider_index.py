@@ -0,0 +1,64 @@
+import math
+import random
+
+import pytest
+
+from src.PolishNHSDataMongifyer.spatial.provider_index import EARTH_RADIUS_KM, ProviderLocation, ProviderSpatialIndex
+
+SERVICES = ("02", "03", "04")
+_query_rng = random.Random(7)
+QUERIES = [(_query_rng.uniform(14.0, 24.2), _query_rng.uniform(49.0, 54.8)) for _ in range(20)]
+
+def haversine_km(lon1, lat1, lon2, lat2):
+    lon1, lat1, lon2, lat2 = map(math.radians, (lon1, lat1, lon2, lat2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+@pytest.fixture(scope="module")
+def locations():
+    rng = random.Random(31)
+    return [ProviderLocation(f"{number:06d}", f"{rng.randint(1, 16):02d}", rng.uniform(14.1, 24.1),
+                             rng.uniform(49.0, 54.8), tuple(sorted(rng.sample(SERVICES, rng.randint(0, 2)))))
+            for number in range(500)]
+
+@pytest.fixture(scope="module")
+def index(locations):
+    return ProviderSpatialIndex(locations)
+
+def brute_force(locations, lon, lat, service_type=None, branch=None):
+    return sorted((haversine_km(lon, lat, location.lon, location.lat), location.code) for location in locations
+                  if (service_type is None or service_type in location.service_types)
+                  and (branch is None or location.branch == branch))
+
+def codes_and_distances(found):
+    return [(distance, location.code) for location, distance in found]
+
+def assert_same(found, expected):
+    assert [code for _, code in found] == [code for _, code in expected]
+    assert [distance for distance, _ in found] == pytest.approx([distance for distance, _ in expected], abs=1e-6)
+
+@pytest.mark.parametrize("service_type, branch", [(None, None), ("03", None), (None, "07"), ("04", "12")])
+def test_nearest_matches_brute_force(locations, index, service_type, branch):
+    for lon, lat in QUERIES:
+        expected = brute_force(locations, lon, lat, service_type, branch)[:5]
+        assert_same(codes_and_distances(index.nearest(lon, lat, 5, service_type, branch)), expected)
+
+@pytest.mark.parametrize("service_type, branch", [(None, None), ("02", None), (None, "01"), ("03", "16")])
+def test_within_radius_matches_brute_force(locations, index, service_type, branch):
+    for lon, lat in QUERIES:
+        expected = [entry for entry in brute_force(locations, lon, lat, service_type, branch) if entry[0] <= 60.0]
+        assert_same(codes_and_distances(index.within_radius(lon, lat, 60.0, service_type, branch)), expected)
+
+def test_queries_without_matching_providers(index):
+    assert index.nearest(21.0, 52.2, 3, service_type="99") == []
+    assert index.nearest(21.0, 52.2, 0) == []
+    assert index.within_radius(21.0, 52.2, 50.0, branch="99") == []
+
+def test_loaded_index_answers_like_the_built_one(tmp_path, index):
+    path = tmp_path / "ProvidersSpatialIndex.bin"
+    index.save(path)
+    loaded = ProviderSpatialIndex.load(path)
+    for lon, lat in QUERIES:
+        assert codes_and_distances(loaded.nearest(lon, lat, 5, "03")) == codes_and_distances(index.nearest(lon, lat, 5, "03"))
+        assert (codes_and_distances(loaded.within_radius(lon, lat, 40.0))
+                == codes_and_distances(index.within_radius(lon, lat, 40.0)))
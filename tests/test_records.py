@@ -0,0 +1,19 @@
+from src.PolishNHSDataMongifyer.collection_setup.db_setup import transform_agreement_page
+from src.PolishNHSDataMongifyer.serialization import json_backend
+
+def agreement(agreement_id, amount):
+    return {"id": agreement_id, "type": "agreement", "attributes": {
+        "code": f"C{agreement_id}", "technical-code": "t", "origin-code": "o", "service-type": "04",
+        "service-name": "svc", "amount": amount, "updated-at": "2025-01-02T03:04:05", "provider-code": "0700001",
+        "provider-nip": "1", "provider-regon": "2", "provider-registry-number": "3", "provider-name": "N",
+        "provider-place": "Warszawa", "year": 2025, "branch": "07"}, "links": {"related": "https://api.nfz.gov.pl/x"}}
+
+def test_invalid_amounts_skip_only_their_agreement(tmp_path):
+    page_path = str(tmp_path / "Offset0.json")
+    json_backend.dump([agreement("1", 100), agreement("2", "abc"), agreement("3", None), agreement("4", 0),
+                       agreement("5", "250.5")], page_path)
+
+    result = transform_agreement_page(page_path)
+    assert [(info.id, info.amount) for info in result.agreements] == [("1", 100.0), ("5", 250.5)]
+    assert len(result.errors) == 3
+    assert result.provider_agreements == {"0700001": ["1", "2", "3", "4", "5"]}